@@ -1,10 +1,12 @@
 """
 Project settings - easy to change
 """
+import os
 
 # Paths
 DATA_PATH = "data/contracts/"
 DB_PATH = "db/chroma_db/"
+MANIFEST_PATH = "db/manifest.json"  # Ingested files + corpus version
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 
@@ -13,5 +15,59 @@ EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 # Retrieval settings
 TOP_K = 5  # Return top 5 chunks per query
+RETRIEVAL_MODE = "hyde_hybrid"  # "hyde_hybrid" (rewrite + HyDE + hybrid) or "multi_query"
+MULTI_QUERY_COUNT = 3  # Sub-queries generated in multi_query mode (original question is added)
+
+# Batch questions (/ask/batch)
+BATCH_LLM_CONCURRENCY = 4  # Parallel Ollama generations
+RERANK_BATCH_SIZE = 64  # Query/chunk pairs per reranker forward pass
+BATCH_WAVE_SIZE = 16  # Questions retrieved + reranked together; a wave's answers start while the next wave is prepared
+MAX_BATCH_QUESTIONS = 500
+
+# CPU scheduling (torch work: embeddings + reranker)
+INTERACTIVE_THREADS = None  # Torch threads for queries (None = all cores)
+BACKGROUND_THREADS = None  # Torch threads for ingestion (None = half the cores)
+INGEST_BATCH_SIZE = 32  # Chunks embedded per background job; queries can cut in between jobs
+BACKGROUND_PAUSE = 0.0  # Seconds to sleep after each ingestion batch (extra throttling)
+
+# Answer context
+CONTEXT_TOKEN_BUDGET = 1000  # Max context tokens sent to the LLM (prompt eval time grows with this)
+CHARS_PER_TOKEN = 4  # Token estimate for budgeting
+
+# Ollama
+# RAG_OLLAMA_URL wins; Ollama's own OLLAMA_HOST is often set without a scheme ("0.0.0.0:11434")
+OLLAMA_HOST = os.environ.get("RAG_OLLAMA_URL") or os.environ.get("OLLAMA_HOST") or "http://localhost:11434"
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = "http://" + OLLAMA_HOST
+OLLAMA_MODEL = "llama3.2:3b"
+OLLAMA_KEEP_ALIVE = "30m"  # Keep model (and its prompt cache) loaded between requests
+
+# Flask server
+BACKEND_PORT = int(os.environ.get("RAG_BACKEND_PORT", "5001"))
+BACKEND_DEBUG = os.environ.get("RAG_BACKEND_DEBUG", "true").lower() == "true"
+
+# Snapshots (read replicas)
+SNAPSHOT_DIR = "db/snapshots/"  # Exported snapshot artifacts
+REPLICA_DIR = "db/replicas/"  # Imported snapshots (one folder each)
+SNAPSHOT_COMPRESSLEVEL = 6  # gzip level: lower = faster export, bigger file
+REPLICA_KEEP = 2  # Imported snapshots kept on disk (active + previous)
+REPLICA_SNAPSHOT = os.environ.get("RAG_REPLICA_SNAPSHOT")  # Set → start read-only from this artifact
+
+# Vector index
+VECTOR_BACKEND = "chroma"  # "chroma" (HNSW) or "mmap" (float16 flat file)
+COLLECTION_NAME = "contracts_collection"
+FILTER_CACHE_SIZE = 32  # Distinct `where` filters whose matching rows are cached (LRU)
+
+# HNSW (chroma backend)
+HNSW_SPACE = "cosine"
+HNSW_M = 16  # Graph links per node: higher = better recall, more memory
+HNSW_EF_CONSTRUCTION = 100  # Build-time candidate list size
+HNSW_EF_SEARCH = 50  # Query-time candidate list size: higher = better recall, slower
+
+# Memory-mapped flat index (mmap backend)
+MMAP_INDEX_PATH = "db/mmap_index/"
+MMAP_SEARCH_MODE = "exact"  # "exact" or "ivf"
+IVF_NLIST = 64  # Number of k-means clusters
+IVF_NPROBE = 8  # Clusters scanned per query: higher = better recall, slower
 
 print("✅ Config loaded!")
@@ -0,0 +1,186 @@
+"""
+Fake Ollama HTTP server for load tests
+Usage:
+    python loadtest/fake_ollama.py --port 11500 --token-latency 0.02 --tokens 60
+    RAG_OLLAMA_URL=http://localhost:11500 python src/backend.py
+
+Speaks the parts of the Ollama API the backend uses:
+- GET  /api/tags       model list (ensure_ollama checks the model is there)
+- GET  /api/version
+- POST /api/chat       ChatOllama (streaming NDJSON or a single JSON reply)
+- POST /api/generate
+
+Latency model per request: prompt_latency per 1000 prompt chars (prompt eval),
+then token_latency per generated token. `slots` caps how many requests
+"generate" at once (like OLLAMA_NUM_PARALLEL); the rest queue.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODEL = "llama3.2:3b"
+
+WORDS = (
+    "the agreement term party shall notice payment clause section termination "
+    "liability confidential obligation effective date renewal governing law"
+).split()
+
+
+class FakeOllama:
+    """Latency settings + counters shared by all request handlers"""
+
+    def __init__(self, model=DEFAULT_MODEL, token_latency=0.02, tokens=60, prompt_latency=0.01, slots=1):
+        self.model = model
+        self.token_latency = token_latency
+        self.tokens = tokens
+        self.prompt_latency = prompt_latency
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "active": self.active, "max_active": self.max_active}
+
+    def generate(self, prompt_chars):
+        """Yield tokens at the configured pace (blocks for a slot first)"""
+        with self._lock:
+            self.requests += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        if self.slots:
+            self.slots.acquire()
+        try:
+            time.sleep(self.prompt_latency * prompt_chars / 1000)
+            for i in range(self.tokens):
+                time.sleep(self.token_latency)
+                yield ("" if i == 0 else " ") + random.choice(WORDS)
+        finally:
+            if self.slots:
+                self.slots.release()
+            with self._lock:
+                self.active -= 1
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.0: streamed bodies end when the connection closes
+        protocol_version = "HTTP/1.0"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, body, code=200):
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{
+                    "name": fake.model, "model": fake.model, "modified_at": _now(),
+                    "size": 0, "digest": "fake", "details": {}
+                }]})
+            elif self.path == "/api/version":
+                self._send_json({"version": "0.0.0-fake"})
+            elif self.path == "/":
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"Ollama is running")
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path not in ("/api/chat", "/api/generate"):
+                self._send_json({"error": "not found"}, 404)
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            chat = self.path == "/api/chat"
+            if chat:
+                prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+            else:
+                prompt_chars = len(body.get("prompt", ""))
+
+            def chunk(text, done):
+                out = {"model": body.get("model", fake.model), "created_at": _now(), "done": done}
+                if chat:
+                    out["message"] = {"role": "assistant", "content": text}
+                else:
+                    out["response"] = text
+                if done:
+                    out.update({
+                        "done_reason": "stop", "total_duration": int((time.perf_counter() - started) * 1e9),
+                        "prompt_eval_count": prompt_chars // 4, "eval_count": fake.tokens
+                    })
+                return out
+
+            started = time.perf_counter()
+            try:
+                if body.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                    for token in fake.generate(prompt_chars):
+                        self.wfile.write((json.dumps(chunk(token, False)) + "\n").encode())
+                        self.wfile.flush()
+                    self.wfile.write((json.dumps(chunk("", True)) + "\n").encode())
+                else:
+                    self._send_json(chunk("".join(fake.generate(prompt_chars)), True))
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client gave up (timeout); nothing to clean up
+
+    return Handler
+
+
+def start_fake_ollama(port=0, host="127.0.0.1", **settings):
+    """
+    Run the fake server in a daemon thread
+    Returns: (server, fake) - server.server_address[1] is the port, server.shutdown() stops it
+    """
+    fake = FakeOllama(**settings)
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+# ===== MAIN: standalone server =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server with configurable latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per generated token")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens per reply")
+    parser.add_argument("--prompt-latency", type=float, default=0.01, help="Seconds per 1000 prompt chars")
+    parser.add_argument("--slots", type=int, default=1, help="Concurrent generations (0 = unlimited)")
+    args = parser.parse_args()
+
+    server, fake = start_fake_ollama(
+        args.port, args.host, model=args.model, token_latency=args.token_latency,
+        tokens=args.tokens, prompt_latency=args.prompt_latency, slots=args.slots
+    )
+    print(f"🦙 Fake Ollama on http://{args.host}:{server.server_address[1]} "
+          f"({args.tokens} tokens x {args.token_latency}s, {args.slots or 'unlimited'} slots)")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📊 {fake.stats()}")
+    except KeyboardInterrupt:
+        server.shutdown()
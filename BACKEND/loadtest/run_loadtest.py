@@ -0,0 +1,362 @@
+"""
+HTTP load test for backend.py: mixed /ask + /upload traffic at increasing concurrency
+Usage (from BACKEND/):
+    python loadtest/run_loadtest.py                                  # fake Ollama + fresh backend
+    python loadtest/run_loadtest.py --levels 1,2,4,8,16 --duration 30 --upload-ratio 0.1
+    python loadtest/run_loadtest.py --token-latency 0.05 --json results.json
+    python loadtest/run_loadtest.py --url http://localhost:5001      # already running backend
+
+What it does:
+1. Starts a fake Ollama server (loadtest/fake_ollama.py) with the chosen token latency
+2. Starts src/backend.py in a temp folder (own db/ and data/), pointed at the fake server
+3. Seeds the index with one generated PDF
+4. For each concurrency level: N closed-loop clients send /ask (and /upload with
+   probability --upload-ratio) for --duration seconds
+5. Prints throughput, p50/p95/p99 latency and error rate per level, plus the
+   saturation point: the first level where throughput stops growing
+   (< --min-gain over the best so far) or p95 / error rate cross their limits
+
+Embeddings and reranking still run for real, so numbers reflect this machine's CPU;
+only the LLM is faked.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+from fake_ollama import start_fake_ollama, DEFAULT_MODEL
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "src")]
+
+from scheduler import percentile  # Same percentile as the backend's scheduler stats
+
+QUESTIONS = [
+    "What is the termination notice period?",
+    "Who are the parties to the agreement?",
+    "When is payment due?",
+    "What does the confidentiality clause cover?",
+    "Which law governs the agreement?",
+    "How does the agreement renew?",
+    "What is the limitation of liability?",
+    "What is the effective date?",
+]
+
+PDF_LINES = [
+    "Service Agreement between Acme Corp and Beta LLC.",
+    "1. Term. This agreement starts on the effective date and renews every year.",
+    "2. Payment. Invoices are due within thirty days of receipt.",
+    "3. Termination. Either party may terminate with sixty days written notice.",
+    "4. Confidentiality. Each party keeps the other party's information confidential.",
+    "5. Liability. Liability is limited to the fees paid in the prior twelve months.",
+    "6. Governing Law. This agreement is governed by the laws of Delaware.",
+]
+
+
+# ===== HELPER: TEST PDF =====
+def make_pdf(lines, pages=1):
+    """Minimal text PDF (one Helvetica text block per page), no extra dependencies"""
+    objects = []
+    page_ids = [3 + 2 * i for i in range(pages)]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    for p in range(pages):
+        text = " ".join(f"({line}) Tj 0 -16 Td" for line in lines + [f"Page {p + 1}."])
+        stream = f"BT /F1 11 Tf 50 780 Td {text} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_ids[p] + 1} 0 R >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+# ===== HELPER: STATS =====
+def summarize(samples, elapsed):
+    """samples: [(op, latency_s, ok)] → throughput, error rate, latency percentiles (ms)"""
+    summary = {"requests": len(samples), "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0}
+    for op in ("all", "ask", "upload"):
+        rows = [s for s in samples if op == "all" or s[0] == op]
+        ok_latencies = [s[1] * 1000 for s in rows if s[2]]
+        summary[op] = {
+            "requests": len(rows),
+            "errors": sum(1 for s in rows if not s[2]),
+            "error_rate": round(sum(1 for s in rows if not s[2]) / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(percentile(ok_latencies, 50), 1),
+            "p95_ms": round(percentile(ok_latencies, 95), 1),
+            "p99_ms": round(percentile(ok_latencies, 99), 1),
+        }
+    summary["good_rps"] = round((len(samples) - summary["all"]["errors"]) / elapsed, 2) if elapsed else 0.0
+    return summary
+
+
+# ===== BACKEND PROCESS =====
+def start_backend(workdir, port, ollama_url, startup_timeout):
+    """Run src/backend.py with workdir as cwd (isolated db/ and data/)"""
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])),
+        RAG_OLLAMA_URL=ollama_url,
+        RAG_BACKEND_PORT=str(port),
+        RAG_BACKEND_DEBUG="false",  # No reloader: one process, one copy of the models
+        PYTHONUNBUFFERED="1",
+    )
+    log = open(os.path.join(workdir, "backend.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "src", "backend.py")],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}, see {log.name}")
+        try:
+            if requests.get(url + "/", timeout=2).status_code == 200:
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    process.terminate()
+    raise TimeoutError(f"Backend not up after {startup_timeout}s, see {log.name}")
+
+
+def stop_backend(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ===== WORKLOAD =====
+class Workload:
+    """Closed-loop clients: each sends its next request as soon as the last one returns"""
+
+    def __init__(self, url, upload_ratio, timeout, mode=None, distinct_questions=len(QUESTIONS)):
+        self.url = url
+        self.upload_ratio = upload_ratio
+        self.timeout = timeout
+        self.mode = mode
+        self.questions = [
+            QUESTIONS[i % len(QUESTIONS)] + ("" if i < len(QUESTIONS) else f" (variant {i})")
+            for i in range(max(1, distinct_questions))
+        ]
+        self.pdf = make_pdf(PDF_LINES)
+        self._upload_seq = 0
+        self._lock = threading.Lock()
+
+    def ask(self, session):
+        body = {"question": random.choice(self.questions)}
+        if self.mode:
+            body["mode"] = self.mode
+        return session.post(self.url + "/ask", json=body, timeout=self.timeout)
+
+    def upload(self, session):
+        with self._lock:
+            self._upload_seq += 1
+            name = f"loadtest_{os.getpid()}_{self._upload_seq}.pdf"
+        return session.post(
+            self.url + "/upload",
+            files={"file": (name, self.pdf, "application/pdf")},
+            data={"doc_type": "contract"},
+            timeout=self.timeout
+        )
+
+    def run_level(self, concurrency, duration):
+        """Run `concurrency` clients for `duration` seconds; returns [(op, latency_s, ok)]"""
+        samples = []
+        stop_at = time.perf_counter() + duration
+
+        def client():
+            session = requests.Session()
+            local = []
+            while time.perf_counter() < stop_at:
+                op = "upload" if random.random() < self.upload_ratio else "ask"
+                started = time.perf_counter()
+                try:
+                    response = (self.upload if op == "upload" else self.ask)(session)
+                    ok = response.status_code == 200
+                except requests.RequestException:
+                    ok = False
+                local.append((op, time.perf_counter() - started, ok))
+            with self._lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+
+def get_metrics(url):
+    try:
+        return requests.get(url + "/metrics", timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return None
+
+
+# ===== SATURATION =====
+def find_saturation(levels, min_gain, max_p95_ms, max_error_rate):
+    """
+    First level where adding clients stops helping or latency/errors fall apart
+    Returns: {"concurrency", "reason", "best_concurrency", "best_throughput_rps"} or None
+    """
+    best = None
+    for level in levels:
+        reasons = []
+        if level["all"]["error_rate"] > max_error_rate:
+            reasons.append(f"error rate {level['all']['error_rate']:.1%} > {max_error_rate:.1%}")
+        if max_p95_ms and level["all"]["p95_ms"] > max_p95_ms:
+            reasons.append(f"p95 {level['all']['p95_ms']:.0f}ms > {max_p95_ms:.0f}ms")
+        if best is not None and level["good_rps"] < best["good_rps"] * (1 + min_gain):
+            reasons.append(f"throughput {level['good_rps']} rps < {1 + min_gain:.2f} x best {best['good_rps']} rps")
+        if reasons:
+            return {
+                "concurrency": level["concurrency"],
+                "reason": "; ".join(reasons),
+                "best_concurrency": best["concurrency"] if best else None,
+                "best_throughput_rps": best["good_rps"] if best else None,
+            }
+        best = level
+    return None
+
+
+def print_table(levels):
+    print(f"\n{'conc':>5} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}"
+          f" {'ask p95':>8} {'upl p95':>8}")
+    for level in levels:
+        a = level["all"]
+        print(f"{level['concurrency']:>5} {level['requests']:>6} {level['throughput_rps']:>7} "
+              f"{a['error_rate'] * 100:>6.1f} {a['p50_ms']:>8.0f} {a['p95_ms']:>8.0f} {a['p99_ms']:>8.0f}"
+              f" {level['ask']['p95_ms']:>8.0f} {level['upload']['p95_ms']:>8.0f}")
+
+
+# ===== MAIN =====
+def main():
+    parser = argparse.ArgumentParser(description="Load test backend.py with a fake Ollama server")
+    parser.add_argument("--url", help="Test an already running backend instead of starting one")
+    parser.add_argument("--port", type=int, default=5051, help="Port for the started backend")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per level")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of single-client warmup")
+    parser.add_argument("--upload-ratio", type=float, default=0.05, help="Share of requests that are uploads")
+    parser.add_argument("--distinct-questions", type=int, default=len(QUESTIONS),
+                        help="Size of the question pool (small = more coalescing)")
+    parser.add_argument("--mode", help="Retrieval mode sent with /ask (default: backend's RETRIEVAL_MODE)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout (s)")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Fake Ollama seconds per token")
+    parser.add_argument("--tokens", type=int, default=60, help="Fake Ollama tokens per reply")
+    parser.add_argument("--prompt-latency", type=float, default=0.01, help="Fake Ollama seconds per 1000 prompt chars")
+    parser.add_argument("--ollama-slots", type=int, default=1, help="Fake Ollama parallel generations (0 = unlimited)")
+    parser.add_argument("--min-gain", type=float, default=0.10, help="Throughput gain below this = saturated")
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="p95 above this = saturated (0 = off)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate above this = saturated")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="Seconds to wait for the backend")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the temp folder (backend.log, db/)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    levels = [int(c) for c in args.levels.split(",") if c.strip()]
+    fake_settings = {
+        "token_latency": args.token_latency, "tokens": args.tokens,
+        "prompt_latency": args.prompt_latency, "slots": args.ollama_slots,
+    }
+
+    print("="*60)
+    print("🏋️ BACKEND LOAD TEST")
+    print("="*60)
+
+    server, fake, process, workdir = None, None, None, None
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+            print(f"🎯 Target: {url} (its own Ollama)")
+        else:
+            server, fake = start_fake_ollama(model=DEFAULT_MODEL, **fake_settings)
+            ollama_url = f"http://127.0.0.1:{server.server_address[1]}"
+            print(f"🦙 Fake Ollama: {ollama_url} ({args.tokens} tokens x {args.token_latency}s, "
+                  f"{args.ollama_slots or 'unlimited'} slots)")
+
+            workdir = tempfile.mkdtemp(prefix="rag-loadtest-")
+            print(f"🚀 Starting backend in {workdir} (loading models)...")
+            process, url = start_backend(workdir, args.port, ollama_url, args.startup_timeout)
+            print(f"✅ Backend up: {url}")
+
+        workload = Workload(url, args.upload_ratio, args.timeout, args.mode, args.distinct_questions)
+
+        print("📄 Seeding index with a test PDF...")
+        response = workload.upload(requests.Session())
+        if response.status_code != 200:
+            raise RuntimeError(f"Seed upload failed: {response.status_code} {response.text[:200]}")
+
+        if args.warmup:
+            print(f"🔥 Warmup ({args.warmup:.0f}s)...")
+            workload.run_level(1, args.warmup)
+
+        results = []
+        for concurrency in levels:
+            print(f"\n⏱️ Concurrency {concurrency} for {args.duration:.0f}s...")
+            started = time.perf_counter()
+            samples = workload.run_level(concurrency, args.duration)
+            level = {"concurrency": concurrency, **summarize(samples, time.perf_counter() - started)}
+            level["backend_metrics"] = get_metrics(url)
+            if fake:
+                level["fake_ollama"] = fake.stats()
+            results.append(level)
+            print(f"   {level['requests']} requests, {level['throughput_rps']} rps, "
+                  f"p95 {level['all']['p95_ms']:.0f}ms, errors {level['all']['error_rate']:.1%}")
+
+        print_table(results)
+        saturation = find_saturation(results, args.min_gain, args.max_p95_ms, args.max_error_rate)
+        if saturation:
+            print(f"\n📉 Saturation at concurrency {saturation['concurrency']}: {saturation['reason']}")
+            if saturation["best_concurrency"]:
+                print(f"🏆 Best: {saturation['best_throughput_rps']} rps at concurrency {saturation['best_concurrency']}")
+        else:
+            print(f"\n📈 No saturation up to concurrency {levels[-1]}")
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({
+                    "config": vars(args),
+                    "levels": results,
+                    "saturation": saturation
+                }, f, indent=2)
+            print(f"💾 Results saved: {args.json}")
+
+    finally:
+        if process:
+            stop_backend(process)
+        if server:
+            server.shutdown()
+        if workdir:
+            if args.keep_workdir:
+                print(f"📁 Kept: {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
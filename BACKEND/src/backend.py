@@ -4,14 +4,22 @@ Run: python src/backend.py
 Test: http://localhost:5000/ask?question=What is OS?
 """
 import os
-from flask import Flask,request,jsonify
+import json
+import threading
+from flask import Flask,request,jsonify,Response,stream_with_context
 from ollama_manager import ensure_ollama
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import sys
 sys.path.append('.')
 
-from stage4_answer import full_rag_pipeline
+from stage4_answer import full_rag_pipeline, full_rag_pipeline_batch
+import stage2_retrieval
+from stage2_retrieval import build_where
+from config.settings import MAX_BATCH_QUESTIONS, BATCH_LLM_CONCURRENCY, REPLICA_SNAPSHOT, RETRIEVAL_MODE
+from config.settings import BACKEND_PORT, BACKEND_DEBUG
+from single_flight import SingleFlight
+from scheduler import scheduler
 
 app=Flask(__name__)
 CORS(app, origins=['http://localhost:3000'])
@@ -25,25 +33,110 @@ def home():
         "message": "RAG Backend API",
         "version": "2.1",
         "endpoints": {
-            "GET  /ask": "Query: ?question=your_question",
+            "GET  /ask": "Query: ?question=your_question (optional: &source=a.pdf&page=3&ingested_after=2026-01-01)",
+            "POST /ask": "JSON: {\"question\": \"...\", \"filters\": {\"sources\": [\"a.pdf\"], \"pages\": {\"from\": 0, \"to\": 5}}}",
             "POST /query": "JSON: {\"question\": \"...\"}",
+            "POST /ask/batch": "JSON: {\"questions\": [\"...\", \"...\"]} → NDJSON stream, one line per answer",
             "POST /upload": "Upload PDF (add clear_old=true to replace)",
             "GET  /files": "List uploaded PDFs",
             "POST /database/clear": "Clear vector database",
-            "GET  /database/stats": "Database statistics"
+            "GET  /database/stats": "Database statistics",
+            "GET  /metrics": "Monitoring counters (request coalescing, CPU scheduler queues)",
+            "GET  /snapshot": "Replica mode + active snapshot",
+            "POST /snapshot/export": "Write index snapshot artifact (primary only)",
+            "POST /snapshot/load": "JSON: {\"path\": \"snapshot.tar.gz\"} hot-swap to snapshot (replica only)"
         },
+        "replica": READ_ONLY_REPLICA,
         "examples": {
             "upload_add": "curl -X POST -F 'file=@doc.pdf' http://localhost:5000/upload",
             "upload_replace": "curl -X POST -F 'file=@doc.pdf' -F 'clear_old=true' http://localhost:5000/upload",
+            "ask_filtered": "curl -X POST -H 'Content-Type: application/json' -d '{\"question\": \"...\", \"filters\": {\"sources\": [\"doc.pdf\"]}}' http://localhost:5000/ask",
             "clear_db": "curl -X POST http://localhost:5000/database/clear"
         }
     })
     
+# ===== READ REPLICA MODE =====
+# RAG_REPLICA_SNAPSHOT=<artifact> → serve that snapshot read-only (no uploads/clears)
+READ_ONLY_REPLICA = bool(REPLICA_SNAPSHOT)
+_snapshot_swap_lock = threading.Lock()
+
+
+def read_only_response():
+    """403 for write endpoints on a replica"""
+    return jsonify({
+        "error": "Read-only replica: load a newer snapshot instead",
+        "snapshot": stage2_retrieval.active_snapshot(),
+        "status": "failed"
+    }), 403
+
+
+def load_snapshot(artifact):
+    """
+    Import a snapshot and hot-swap the serving index to it
+    The new index is fully opened before the swap, so requests never wait
+    """
+    from snapshot import import_snapshot, open_replica, prune_replicas
+    with _snapshot_swap_lock:
+        folder, _ = import_snapshot(artifact)
+        index, keyword_index, manifest_path, meta = open_replica(folder, stage2_retrieval.embedding_model)
+        previous = stage2_retrieval.active_snapshot()
+        stage2_retrieval.set_vector_index(index, manifest_path, keyword_index, snapshot=meta)
+        prune_replicas([folder, previous and previous["path"]])
+    return meta
+
+
+# ===== REQUEST COALESCING =====
+# Identical questions arriving together (e.g. after a company-wide email)
+# share one pipeline run instead of each hitting Ollama and the reranker
+ask_flight = SingleFlight()
+
+
+def normalize_question(question):
+    """Lowercase, collapse whitespace, drop trailing punctuation"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def answer_question(question, doc_type="contract", filters=None, mode=RETRIEVAL_MODE):
+    """
+    Run full_rag_pipeline once per (question, doc_type, filters, mode, corpus version)
+    among concurrent requests
+    Returns: (answer, coalesced)
+    """
+    key = json.dumps(
+        [normalize_question(question), doc_type, filters, mode, stage2_retrieval.current_corpus_version()],
+        sort_keys=True
+    )
+    return ask_flight.do(key, full_rag_pipeline, question, doc_type, filters=filters, mode=mode)
+
+
+def filters_from_args(args):
+    """
+    Build /ask filters from query params
+    ?source=a.pdf&source=b.pdf&page=3&doc_type_filter=contract&ingested_after=2026-01-01
+    """
+    filters = {}
+    if args.getlist('source'):
+        filters["sources"] = args.getlist('source')
+    if args.getlist('page'):
+        try:
+            filters["pages"] = [int(p) for p in args.getlist('page')]
+        except ValueError:
+            raise ValueError("page must be an integer")
+    if args.get('doc_type_filter'):
+        filters["doc_type"] = args.getlist('doc_type_filter')
+    for key in ("ingested_after", "ingested_before"):
+        if args.get(key):
+            filters[key] = args.get(key)
+    return filters or None
+
+
 @app.route('/ask',methods=['GET'])
 def ask_get():
     """
     GET endpoint for simple browser testing
     Example: /ask?question=What is OS?
+    Filters: &source=a.pdf&page=3&doc_type_filter=contract&ingested_after=2026-01-01
+    Retrieval mode: &mode=multi_query
     """
     try:
         question=request.args.get('question',' ').strip()
@@ -53,16 +146,27 @@ def ask_get():
                 "example": "/ask?question=What is OS?"
             }),400
         
+        filters = filters_from_args(request.args)
+        mode = request.args.get('mode', RETRIEVAL_MODE)
+        
         print('Get processing')
-        answer=full_rag_pipeline(question)
+        answer, coalesced = answer_question(question, filters=filters, mode=mode)
         
         return jsonify({
             "question": question,
             "answer": answer,
+            "filters": filters,
+            "mode": mode,
+            "coalesced": coalesced,
             "method": "GET",
             "status": "success"
         }),200
         
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "status": "failed"
+        }),400
     except Exception as e:
         print(f"Exception {e}")
         return jsonify({
@@ -74,7 +178,9 @@ def ask_get():
 def ask_post():
     """
     POST endpoint for frontend/app integration
-    Body: {"question": "What is OS?", "doc_type": "contract"}
+    Body: {"question": "What is OS?", "doc_type": "contract", "mode": "multi_query",
+           "filters": {"sources": ["a.pdf"], "pages": {"from": 0, "to": 5},
+                       "doc_type": "contract", "ingested_after": "2026-01-01"}}
     """
     try:
         data = request.get_json()
@@ -87,6 +193,8 @@ def ask_post():
         
         question =data.get('question',' ').strip()
         doc_type = data.get('doc_type', 'contract')
+        filters = data.get('filters')
+        mode = data.get('mode', RETRIEVAL_MODE)
         
         if not question:
             return jsonify({
@@ -95,16 +203,24 @@ def ask_post():
             }),400
             
         print(f"post processing {question}");
-        answer=full_rag_pipeline(question)
+        answer, coalesced = answer_question(question, doc_type, filters=filters, mode=mode)
         
         return({
             "question": question,
             "answer": answer,
             "doc_type": doc_type,
+            "filters": filters,
+            "mode": mode,
+            "coalesced": coalesced,
             "method": "POST",
             "status": "success"
         }),200
         
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "status": "failed"
+        }), 400
     except Exception as e:
         print(f"❌ Error: {e}")
         return jsonify({
@@ -113,6 +229,53 @@ def ask_post():
         }), 500
 
 
+@app.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """
+    Batch questions for offline jobs (shared retrieval, batched model calls)
+    Body: {"questions": ["...", "..."], "doc_type": "contract", "filters": {...}, "max_concurrency": 4}
+    max_concurrency is capped at BATCH_LLM_CONCURRENCY
+    Response: NDJSON stream, one {"index", "question", "answer"|"error", "status"} line
+    per question in completion order
+    
+    Usage:
+    curl -N -X POST -H "Content-Type: application/json" -d '{"questions": ["q1", "q2"]}' http://localhost:5000/ask/batch
+    """
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('questions'), list):
+        return jsonify({
+            "error": "questions (list) is required",
+            "example": {"questions": ["What is the notice period?", "Who are the parties?"]}
+        }), 400
+    
+    questions = [q.strip() for q in data['questions'] if isinstance(q, str) and q.strip()]
+    if not questions:
+        return jsonify({"error": "No non-empty questions provided"}), 400
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"}), 400
+    
+    doc_type = data.get('doc_type', 'contract')
+    filters = data.get('filters')
+    try:
+        build_where(filters)
+        # Clients may lower LLM parallelism, never raise it above the server setting
+        max_concurrency = min(max(1, int(data.get('max_concurrency', BATCH_LLM_CONCURRENCY))), BATCH_LLM_CONCURRENCY)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e), "status": "failed"}), 400
+    
+    print(f"batch processing {len(questions)} questions")
+    
+    def generate():
+        try:
+            for result in full_rag_pipeline_batch(questions, doc_type, filters, max_concurrency):
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            print(f"❌ Batch error: {e}")
+            yield json.dumps({"error": str(e), "status": "failed"}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 # configer upload
 UPLOAD_FOLDER='data/contracts'
 ALLOWED_EXTENSIONS={"pdf"}
@@ -132,7 +295,10 @@ def upload():
     Usage:
     curl -X POST -F "file=@document.pdf" http://localhost:5000/upload
     curl -X POST -F "file=@document.pdf" -F "clear_old=true" http://localhost:5000/upload
+    curl -X POST -F "file=@document.pdf" -F "doc_type=contract" http://localhost:5000/upload
     """
+    if READ_ONLY_REPLICA:
+        return read_only_response()
     try:
         if 'file' not in request.files:
             return jsonify({"error": "No file sent"}), 400
@@ -150,6 +316,7 @@ def upload():
         
         # Check if user wants to clear old data
         clear_old = request.form.get('clear_old', 'false').lower() == 'true'
+        doc_type = request.form.get('doc_type', 'contract')
         
         # ===== ADD TO DATABASE =====
         from stage1_ingestion import ingest_single_pdf, clear_database
@@ -158,13 +325,14 @@ def upload():
             print("🧹 Clearing old database before upload...")
             clear_database()
         
-        chunks_added = ingest_single_pdf(filepath)
+        chunks_added = ingest_single_pdf(filepath, doc_type)
         
         return jsonify({
             "status": "success",
             "message": f"Uploaded {filename}",
             "path": filepath,
             "chunks_added": chunks_added,
+            "doc_type": doc_type,
             "cleared_old_data": clear_old
         }), 200
     
@@ -204,6 +372,8 @@ def delete_file(filename):
     Usage:
     curl -X DELETE http://localhost:5001/files/document.pdf
     """
+    if READ_ONLY_REPLICA:
+        return read_only_response()
     try:
         if not allowed_file(filename):
             return jsonify({"error": "Invalid file type"}), 400
@@ -232,6 +402,8 @@ def clear_db():
     Usage:
     curl -X POST http://localhost:5000/database/clear
     """
+    if READ_ONLY_REPLICA:
+        return read_only_response()
     try:
         from stage1_ingestion import clear_database
         clear_database()
@@ -255,8 +427,19 @@ def db_stats():
     curl http://localhost:5000/database/stats
     """
     try:
-        from stage1_ingestion import get_database_stats
-        stats = get_database_stats()
+        if READ_ONLY_REPLICA:
+            index_stats = stage2_retrieval.vectortores.stats()
+            stats = {
+                "exists": True,
+                "db_path": index_stats["path"],
+                "total_chunks": index_stats["chunks"],
+                "index": index_stats,
+                "corpus_version": stage2_retrieval.current_corpus_version(),
+                "snapshot": stage2_retrieval.active_snapshot()
+            }
+        else:
+            from stage1_ingestion import get_database_stats
+            stats = get_database_stats()
         
         return jsonify({
             "status": "success",
@@ -265,7 +448,101 @@ def db_stats():
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Monitoring counters
+    coalescing: executions = pipeline runs, coalesced = requests served by another run
+    scheduler: torch job queue depths + admission wait per pool (interactive / background)
+    
+    Usage:
+    curl http://localhost:5000/metrics
+    """
+    return jsonify({
+        "status": "success",
+        "coalescing": ask_flight.stats(),
+        "scheduler": scheduler.stats()
+    }), 200
+
+
+@app.route('/snapshot', methods=['GET'])
+def snapshot_status():
+    """
+    Replica mode and the snapshot being served
+    
+    Usage:
+    curl http://localhost:5000/snapshot
+    """
+    return jsonify({
+        "status": "success",
+        "replica": READ_ONLY_REPLICA,
+        "corpus_version": stage2_retrieval.current_corpus_version(),
+        "snapshot": stage2_retrieval.active_snapshot()
+    }), 200
+
+
+@app.route('/snapshot/export', methods=['POST'])
+def snapshot_export():
+    """
+    Write a consistent, compressed snapshot of the index (primary only)
+    Holds the ingestion lock only while files are copied
+    
+    Usage:
+    curl -X POST http://localhost:5000/snapshot/export
+    """
+    if READ_ONLY_REPLICA:
+        return read_only_response()
+    try:
+        from snapshot import export_snapshot
+        from stage1_ingestion import ingest_lock
+        artifact, meta = export_snapshot(lock=ingest_lock, index=stage2_retrieval.vectortores)
         
+        return jsonify({
+            "status": "success",
+            "artifact": artifact,
+            "snapshot": meta
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/snapshot/load', methods=['POST'])
+def snapshot_load():
+    """
+    Hot-swap a replica to a newer snapshot without downtime
+    Body: {"path": "db/snapshots/rag-snapshot-v7-20260101-120000.tar.gz"}
+    
+    Usage:
+    curl -X POST -H "Content-Type: application/json" -d '{"path": "snap.tar.gz"}' http://localhost:5000/snapshot/load
+    """
+    if not READ_ONLY_REPLICA:
+        return jsonify({
+            "error": "Snapshots can only be loaded in replica mode (set RAG_REPLICA_SNAPSHOT)",
+            "status": "failed"
+        }), 403
+    
+    data = request.get_json(silent=True) or {}
+    artifact = data.get('path', '').strip()
+    if not artifact:
+        return jsonify({"error": "path is required", "example": {"path": "snapshot.tar.gz"}}), 400
+    if not os.path.exists(artifact):
+        return jsonify({"error": f"Snapshot not found: {artifact}"}), 404
+    
+    try:
+        meta = load_snapshot(artifact)
+        return jsonify({
+            "status": "success",
+            "snapshot": meta
+        }), 200
+    
+    except ValueError as e:
+        return jsonify({"error": str(e), "status": "failed"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
         
 
 
@@ -275,13 +552,16 @@ if __name__ == '__main__':
     print("🚀 RAG Backend Starting...")
     print("="*60)
     ensure_ollama()  # Your manager handles everything!
-    print("📍 Server: http://localhost:5001")
+    if READ_ONLY_REPLICA:
+        print(f"📦 Read-only replica mode: {REPLICA_SNAPSHOT}")
+        load_snapshot(REPLICA_SNAPSHOT)
+    print(f"📍 Server: http://localhost:{BACKEND_PORT}")
     print("\n📌 Endpoints:")
-    print("   GET  → http://localhost:5001/ask?question=What is OS?")
-    print("   POST → http://localhost:5001/query")
+    print(f"   GET  → http://localhost:{BACKEND_PORT}/ask?question=What is OS?")
+    print(f"   POST → http://localhost:{BACKEND_PORT}/query")
     print("          Body: {\"question\": \"What is OS?\"}")
     print("\n🛑 Stop: Press Ctrl+C")
     print("="*60 + "\n")
     
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    app.run(host='0.0.0.0', port=BACKEND_PORT, debug=BACKEND_DEBUG)
         
\ No newline at end of file
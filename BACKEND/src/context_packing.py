@@ -0,0 +1,177 @@
+"""
+Context packing: reranked chunks → compact prompt context
+Usage: from context_packing import pack_context
+
+Runs between rerank_chunks() and the final llm.invoke():
+1. Merge chunks that overlap or touch on the same page (removes CHUNK_OVERLAP duplicates)
+2. If still over budget, keep only the sentences most relevant to the query
+3. Fit CONTEXT_TOKEN_BUDGET (estimated as characters / CHARS_PER_TOKEN)
+"""
+import os
+import re
+import sys
+import math
+sys.path.append('.')
+
+from config.settings import CHUNK_OVERLAP, CONTEXT_TOKEN_BUDGET, CHARS_PER_TOKEN
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+WORD = re.compile(r"\w+")
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "has", "have", "how", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to",
+    "was", "what", "when", "where", "which", "who", "why", "will", "with", "shall", "any",
+}
+
+
+def estimate_tokens(text):
+    """Rough token count (no tokenizer for the Ollama model in-process)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _terms(text):
+    return [w for w in WORD.findall(text.lower()) if w not in STOP_WORDS]
+
+
+# ===== STEP 1: MERGE OVERLAPPING CHUNKS =====
+def _text_overlap(left, right):
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    for size in range(min(len(left), len(right), CHUNK_OVERLAP * 2), 9, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(chunks):
+    """
+    Merge chunks from the same source/page that overlap or are adjacent
+    Returns blocks: [{"text", "source", "page", "rank"}] in relevance order
+    (rank = best rerank position of any merged chunk)
+    """
+    groups = {}
+    for rank, chunk in enumerate(chunks):
+        meta = chunk.metadata or {}
+        key = (meta.get("source_name") or os.path.basename(meta.get("source", "")), meta.get("page"))
+        groups.setdefault(key, []).append((rank, chunk))
+
+    blocks = []
+    for (source, page), members in groups.items():
+        # start_index (set at ingestion) gives document order; older chunks keep rerank order
+        if all("start_index" in c.metadata for _, c in members):
+            members.sort(key=lambda m: m[1].metadata["start_index"])
+
+        current = None
+        for rank, chunk in members:
+            text = chunk.page_content
+            start = chunk.metadata.get("start_index")
+            if current is not None:
+                if start is not None and current["end"] is not None and start <= current["end"] + 1:
+                    if start < current["end"]:
+                        # Positional overlap: append only the new tail
+                        current["text"] += text[current["end"] - start:]
+                    else:
+                        # Adjacent (the splitter may have stripped one separator): join with a space
+                        current["text"] = current["text"].rstrip() + " " + text.lstrip()
+                    current["end"] = max(current["end"], start + len(text))
+                    current["rank"] = min(current["rank"], rank)
+                    continue
+                # Text matching only when a position is unknown: positioned chunks that
+                # don't touch are separate passages even if they repeat a phrase
+                positioned = start is not None and current["end"] is not None
+                overlap = 0 if positioned else _text_overlap(current["text"], text)
+                if overlap:
+                    current["text"] += text[overlap:]
+                    current["end"] = None if start is None else start + len(text)
+                    current["rank"] = min(current["rank"], rank)
+                    continue
+                blocks.append(current)
+            current = {
+                "text": text,
+                "source": source,
+                "page": page,
+                "rank": rank,
+                "end": None if start is None else start + len(text),
+            }
+        blocks.append(current)
+
+    blocks.sort(key=lambda b: b["rank"])
+    return blocks
+
+
+# ===== STEP 2: QUERY-FOCUSED SENTENCE SELECTION =====
+def _select_sentences(query, blocks, budget):
+    """Keep the highest-scoring sentences (IDF-weighted query term overlap) within budget"""
+    sentences = []  # (block index, position, text)
+    for b, block in enumerate(blocks):
+        for pos, sentence in enumerate(s.strip() for s in SENTENCE_SPLIT.split(block["text"])):
+            if sentence:
+                sentences.append((b, pos, sentence))
+
+    doc_freq = {}
+    sentence_terms = []
+    for _, _, sentence in sentences:
+        terms = set(_terms(sentence))
+        sentence_terms.append(terms)
+        for term in terms:
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    query_terms = set(_terms(query))
+    total = len(sentences)
+
+    def score(i):
+        b = sentences[i][0]
+        matched = query_terms & sentence_terms[i]
+        relevance = sum(math.log(1 + total / doc_freq[t]) for t in matched)
+        # Small tie-breaker so better-reranked blocks win among equal sentences
+        return relevance + 1 / (blocks[b]["rank"] + 2)
+
+    order = sorted(range(total), key=score, reverse=True)
+    kept, seen, used = set(), set(), 0
+    for i in order:
+        text = sentences[i][2]
+        cost = estimate_tokens(text) + 1
+        if text in seen or used + cost > budget:
+            continue
+        kept.add(i)
+        seen.add(text)
+        used += cost
+
+    packed = [[] for _ in blocks]
+    last_pos = [-1 for _ in blocks]
+    for i, (b, pos, sentence) in enumerate(sentences):
+        if i in kept:
+            if packed[b] and pos != last_pos[b] + 1:
+                packed[b].append("...")
+            packed[b].append(sentence)
+            last_pos[b] = pos
+
+    for block, parts in zip(blocks, packed):
+        block["text"] = " ".join(parts)
+    return [block for block in blocks if block["text"]]
+
+
+# ===== MAIN: PACK =====
+def pack_context(query, chunks, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Reranked chunks → context string within token_budget
+    Each block is labelled with its source/page so the answer can cite it
+    """
+    if not chunks:
+        return ""
+
+    blocks = merge_chunks(chunks)
+
+    def render(block):
+        page = "" if block["page"] is None else f", page {block['page']}"
+        return f"[{block['source']}{page}]\n{block['text']}"
+
+    before = sum(estimate_tokens(c.page_content) for c in chunks)
+    # Reserve room for the per-block labels
+    label_tokens = sum(estimate_tokens(render({**b, "text": ""})) + 1 for b in blocks)
+    if sum(estimate_tokens(b["text"]) for b in blocks) + label_tokens > token_budget:
+        blocks = _select_sentences(query, blocks, max(token_budget - label_tokens, 0))
+
+    context = "\n\n".join(render(b) for b in blocks)
+    print(f"   🗜️ Context packed: ~{before} → ~{estimate_tokens(context)} tokens "
+          f"({len(chunks)} chunks → {len(blocks)} blocks)")
+    return context
@@ -0,0 +1,129 @@
+"""
+BM25 keyword index as a sparse matrix
+Usage: from keyword_index import KeywordIndex
+
+Same scoring as rank_bm25.BM25Okapi, but the per-document BM25 weights are
+precomputed once, so scoring any number of queries is one sparse matrix product:
+    scores (queries x docs) = query_term_counts @ bm25_weights.T
+"""
+import os
+import sys
+import json
+from collections import Counter
+sys.path.append('.')
+
+import nltk
+import numpy as np
+from scipy.sparse import csr_matrix, save_npz, load_npz
+from langchain_core.documents import Document
+
+from metadata_filters import FilterCache
+
+nltk.download('punkt', quiet=True)
+nltk.download('punkt_tab', quiet=True)  # Needed by word_tokenize in nltk >= 3.9
+
+
+def tokenize(text):
+    return nltk.word_tokenize(text.lower())
+
+
+class KeywordIndex:
+    """BM25 over a fixed set of chunks (rebuild when the corpus changes)"""
+
+    def __init__(self, ids, texts, metadatas, k1=1.5, b=0.75, epsilon=0.25):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = [m or {} for m in metadatas]
+        self._filter_cache = FilterCache()
+
+        vocab = {}
+        rows, cols, counts = [], [], []
+        doc_len = np.zeros(len(self.texts), dtype=np.float64)
+        for d, text in enumerate(self.texts):
+            tokens = tokenize(text)
+            doc_len[d] = len(tokens)
+            for term, count in Counter(tokens).items():
+                rows.append(d)
+                cols.append(vocab.setdefault(term, len(vocab)))
+                counts.append(count)
+        self.vocab = vocab
+
+        n_docs = len(self.texts)
+        rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+        tf = np.array(counts, dtype=np.float64)
+
+        # BM25Okapi idf, negative values floored to epsilon * mean idf
+        doc_freq = np.bincount(cols, minlength=len(vocab))
+        idf = np.log(n_docs - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+
+        avgdl = doc_len.mean() if n_docs else 1.0
+        weights = idf[cols] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[rows] / avgdl))
+        self.matrix = csr_matrix((weights, (rows, cols)), shape=(n_docs, len(vocab)))
+
+    # ----- persistence (used by snapshots) -----
+    def save(self, folder):
+        """Write keyword_index.npz (BM25 weights) + keyword_index.json (vocab, chunks)"""
+        os.makedirs(folder, exist_ok=True)
+        save_npz(os.path.join(folder, "keyword_index.npz"), self.matrix)
+        with open(os.path.join(folder, "keyword_index.json"), "w") as f:
+            json.dump({
+                "vocab": self.vocab,
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas
+            }, f)
+
+    @classmethod
+    def load(cls, folder):
+        """Load a saved index without re-tokenizing the corpus"""
+        with open(os.path.join(folder, "keyword_index.json")) as f:
+            data = json.load(f)
+        index = cls.__new__(cls)
+        index.ids, index.texts, index.metadatas = data["ids"], data["texts"], data["metadatas"]
+        index.vocab = data["vocab"]
+        index.matrix = load_npz(os.path.join(folder, "keyword_index.npz")).tocsr()
+        index._filter_cache = FilterCache()
+        return index
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _query_matrix(self, queries):
+        rows, cols, counts = [], [], []
+        for q, query in enumerate(queries):
+            for term, count in Counter(tokenize(query)).items():
+                if term in self.vocab:
+                    rows.append(q)
+                    cols.append(self.vocab[term])
+                    counts.append(count)
+        return csr_matrix((counts, (rows, cols)), shape=(len(queries), len(self.vocab)), dtype=np.float64)
+
+    def rows_matching(self, where):
+        """Row numbers whose metadata matches a Chroma-style `where` filter"""
+        return self._filter_cache.rows(where, self.metadatas)
+
+    def get_scores(self, queries, where=None):
+        """
+        BM25 scores for all queries in one pass
+        Returns: (rows, scores) - scores[q, j] is the score of chunk rows[j]
+        With `where`, only matching chunks are scored
+        """
+        rows = self.rows_matching(where) if where else np.arange(len(self.texts))
+        if not len(rows) or not len(self.vocab):
+            return rows, np.zeros((len(queries), len(rows)))
+        matrix = self.matrix[rows] if where else self.matrix
+        return rows, (self._query_matrix(queries) @ matrix.T).toarray()
+
+    def search(self, queries, k=5, where=None):
+        """Top-k chunks (as Documents) for each query; zero-score chunks are skipped"""
+        rows, scores = self.get_scores(queries, where)
+        results = []
+        for query_scores in scores:
+            top = np.argsort(-query_scores, kind="stable")[:k]
+            results.append([self._document(int(rows[j])) for j in top if query_scores[j] > 0])
+        return results
+
+    def _document(self, i):
+        return Document(page_content=self.texts[i], metadata=self.metadatas[i], id=self.ids[i])
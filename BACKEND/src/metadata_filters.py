@@ -0,0 +1,173 @@
+"""
+Metadata filters: /ask filters → Chroma-style `where` clause, and evaluating it
+Usage: from metadata_filters import build_where, match_where, FilterCache
+
+Chroma evaluates `where` itself; the mmap backend and BM25 use match_where.
+No models or vector stores are loaded here, so it is cheap to import.
+"""
+import os
+import sys
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+sys.path.append('.')
+
+import numpy as np
+
+from config.settings import DATA_PATH, FILTER_CACHE_SIZE
+
+
+def _to_timestamp(value):
+    """Unix time from a number or an ISO date string ("2026-01-31")"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r} (use unix time or YYYY-MM-DD)")
+
+
+def _page_number(value):
+    """Page filters take ints only (bool is an int subclass, "12" would iterate as 1, 2)"""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Invalid page: {value!r} (use an integer)")
+    return value
+
+
+def _sources_condition(names):
+    """
+    Match chunks by file name. Chunks ingested before source_name existed only
+    have PyPDFLoader's `source` path (DATA_PATH/<name>); `where` has no
+    basename operator, so those are matched on the full path instead
+    """
+    paths = [os.path.normpath(os.path.join(DATA_PATH, name)) for name in names]
+    return {"$or": [{"source_name": {"$in": names}}, {"source": {"$in": paths}}]}
+
+
+def build_where(filters):
+    """
+    Turn /ask filters into a Chroma `where` clause (None = whole collection)
+
+    filters = {
+        "sources": ["lease.pdf"],            # file names (older chunks: matched by path)
+        "pages": [0, 1] or {"from": 0, "to": 5},
+        "doc_type": "contract" or [...],
+        "ingested_after": "2026-01-01",      # unix time or ISO date
+        "ingested_before": 1767225600
+    }
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+
+    unknown = set(filters) - {"sources", "pages", "doc_type", "ingested_after", "ingested_before"}
+    if unknown:
+        raise ValueError(f"Unknown filter(s): {', '.join(sorted(unknown))}")
+
+    conditions = []
+
+    sources = filters.get("sources")
+    if sources:
+        if isinstance(sources, str):
+            sources = [sources]
+        conditions.append(_sources_condition(list(sources)))
+
+    pages = filters.get("pages")
+    if pages is not None:
+        if isinstance(pages, dict):
+            if "from" in pages:
+                conditions.append({"page": {"$gte": _page_number(pages["from"])}})
+            if "to" in pages:
+                conditions.append({"page": {"$lte": _page_number(pages["to"])}})
+        elif isinstance(pages, list):
+            conditions.append({"page": {"$in": [_page_number(p) for p in pages]}})
+        else:
+            conditions.append({"page": {"$in": [_page_number(pages)]}})
+
+    doc_type = filters.get("doc_type")
+    if doc_type:
+        if isinstance(doc_type, str):
+            doc_type = [doc_type]
+        conditions.append({"doc_type": {"$in": list(doc_type)}})
+
+    if filters.get("ingested_after") is not None:
+        conditions.append({"ingested_at": {"$gte": _to_timestamp(filters["ingested_after"])}})
+    if filters.get("ingested_before") is not None:
+        conditions.append({"ingested_at": {"$lte": _to_timestamp(filters["ingested_before"])}})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+# ===== EVALUATING `where` =====
+def match_where(where, metadata):
+    """Evaluate a Chroma-style `where` filter against one metadata dict"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(sub, metadata) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(sub, metadata) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, target in condition.items():
+                if not _compare(op, value, target):
+                    return False
+    return True
+
+
+class FilterCache:
+    """Small LRU of `where` filter → matching row numbers (one per loaded corpus)"""
+
+    def __init__(self, maxsize=FILTER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rows(self, where, metadatas):
+        key = json.dumps(where, sort_keys=True)
+        with self._lock:
+            if key in self._rows:
+                self._rows.move_to_end(key)
+                return self._rows[key]
+
+        rows = np.array([i for i, metadata in enumerate(metadatas) if match_where(where, metadata)], dtype=np.int64)
+        with self._lock:
+            self._rows[key] = rows
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+        return rows
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def _compare(op, value, target):
+    if op == "$eq":
+        return value == target
+    if op == "$ne":
+        return value != target
+    if op == "$in":
+        return value in target
+    if op == "$nin":
+        return value not in target
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > target
+    if op == "$gte":
+        return value >= target
+    if op == "$lt":
+        return value < target
+    if op == "$lte":
+        return value <= target
+    raise ValueError(f"Unsupported filter operator: {op}")
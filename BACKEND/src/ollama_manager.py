@@ -8,6 +8,9 @@ import requests
 import atexit
 import signal
 import sys
+sys.path.append('.')
+
+from config.settings import OLLAMA_HOST, OLLAMA_MODEL
 
 
 class OllamaManager:
@@ -15,7 +18,7 @@ class OllamaManager:
     
     def __init__(self):
         self.process = None
-        self.host = "http://localhost:11434"
+        self.host = OLLAMA_HOST
     
     def is_running(self):
         """Check if Ollama is already running"""
@@ -68,7 +71,7 @@ class OllamaManager:
                 self.process.kill()
                 print("⚠️ Ollama force killed")
     
-    def ensure_model(self, model_name="llama3.2:3b"):
+    def ensure_model(self, model_name=OLLAMA_MODEL):
         """Check if model is pulled, pull if needed"""
         try:
             response = requests.get(f"{self.host}/api/tags")
@@ -92,7 +95,7 @@ atexit.register(ollama_mgr.stop)
 
 
 # ===== HELPER FUNCTION =====
-def ensure_ollama(model_name="llama3.2:3b"):
+def ensure_ollama(model_name=OLLAMA_MODEL):
     """
     Main function to call from your app
     Ensures Ollama is running and model is available
@@ -0,0 +1,128 @@
+"""
+CPU scheduler for PyTorch work (embeddings, reranker)
+Usage:
+    from scheduler import scheduler
+    with scheduler.interactive():   # /ask: query embedding, reranking
+        ...
+    with scheduler.background():    # /upload ingestion batch, /ask/batch embedding/rerank slice
+        ...
+
+Why: upload embedding, the reranker and query embedding all run torch on the
+same cores. Running them at the same time oversubscribes the CPU and a big
+upload makes every question slow. Here:
+- torch jobs run one at a time, each with its pool's thread budget
+  (torch.set_num_threads is process-wide, so this is only safe because jobs don't overlap)
+- interactive jobs always go first: a background job waits while any
+  interactive job is waiting, so ingestion pauses between batches
+- optional BACKGROUND_PAUSE after each background batch throttles ingestion further
+"""
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+sys.path.append('.')
+
+from config.settings import INTERACTIVE_THREADS, BACKGROUND_THREADS, BACKGROUND_PAUSE
+
+POOLS = ("interactive", "background")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (0.0 for no values); also used by loadtest/run_loadtest.py"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResourceScheduler:
+    """Single torch lane with interactive-first admission and per-pool thread budgets"""
+
+    def __init__(self, interactive_threads=INTERACTIVE_THREADS, background_threads=BACKGROUND_THREADS,
+                 background_pause=BACKGROUND_PAUSE):
+        cores = os.cpu_count() or 1
+        self.budgets = {
+            "interactive": interactive_threads or cores,
+            "background": background_threads or max(1, cores // 2),
+        }
+        self.background_pause = background_pause
+
+        self._cond = threading.Condition()
+        self._local = threading.local()  # Re-entrant: nested calls in a job run inline
+        self._running = None
+        self._threads_set = None
+        self._waiting = {pool: 0 for pool in POOLS}
+        self._completed = {pool: 0 for pool in POOLS}
+        self._wait_ms = {pool: deque(maxlen=1000) for pool in POOLS}
+
+    def _set_threads(self, count):
+        if count == self._threads_set:
+            return
+        import torch
+        torch.set_num_threads(count)
+        self._threads_set = count
+
+    @contextmanager
+    def _job(self, pool):
+        if getattr(self._local, "depth", 0):
+            # Already inside a job on this thread (e.g. rerank within a pipeline step)
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        started = time.perf_counter()
+        with self._cond:
+            self._waiting[pool] += 1
+            while self._running is not None or (pool == "background" and self._waiting["interactive"]):
+                self._cond.wait()
+            self._waiting[pool] -= 1
+            self._running = pool
+            self._wait_ms[pool].append((time.perf_counter() - started) * 1000)
+            self._set_threads(self.budgets[pool])
+
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._running = None
+                self._completed[pool] += 1
+                self._cond.notify_all()
+
+        if pool == "background" and self.background_pause:
+            time.sleep(self.background_pause)
+
+    def interactive(self):
+        """Latency-sensitive torch work (queries)"""
+        return self._job("interactive")
+
+    def background(self):
+        """Throughput work (ingestion); keep each job small so queries never wait long"""
+        return self._job("background")
+
+    def stats(self):
+        """Queue depths and admission wait times for monitoring"""
+        with self._cond:
+            return {
+                "running": self._running,
+                "thread_budgets": dict(self.budgets),
+                "queues": {
+                    pool: {
+                        "waiting": self._waiting[pool],
+                        "completed": self._completed[pool],
+                        "wait_ms_p50": round(percentile(self._wait_ms[pool], 50), 1),
+                        "wait_ms_p95": round(percentile(self._wait_ms[pool], 95), 1),
+                    }
+                    for pool in POOLS
+                }
+            }
+
+
+# ===== GLOBAL INSTANCE =====
+scheduler = ResourceScheduler()
@@ -0,0 +1,80 @@
+"""
+Single-flight request coalescing
+Usage: from single_flight import SingleFlight
+
+Concurrent calls with the same key share ONE execution:
+the first caller (leader) runs the function, the rest wait and get its result.
+"""
+import threading
+
+
+class _Call:
+    """One in-flight execution"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces identical in-flight work and counts how often it helped"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executions = 0  # Calls that actually ran the function
+        self._coalesced = 0  # Calls that reused another call's result
+        self._errors = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) once per key among concurrent callers
+        Returns: (result, shared) - shared=True if this caller waited on another
+        Exceptions raised by the leader are raised in every waiting caller too
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            total = self._executions + self._coalesced
+            return {
+                "executions": self._executions,
+                "coalesced": self._coalesced,
+                "errors": self._errors,
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "coalesced_ratio": round(self._coalesced / total, 3) if total else 0.0
+            }
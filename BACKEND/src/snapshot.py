@@ -0,0 +1,265 @@
+"""
+Index snapshots: export once, provision read replicas fast
+Usage:
+    python src/snapshot.py export            # → db/snapshots/rag-snapshot-v<version>-<time>.tar.gz
+    python src/snapshot.py import <artifact> # → db/replicas/<name>/
+
+A snapshot is a gzip tarball with:
+- snapshot.json        format, corpus version, backend, embedding model, sha256 of every file
+- manifest.json        ingestion manifest (files + corpus version)
+- chroma_db/ or mmap_index/   vector index files
+- keyword_index.npz/.json     prebuilt BM25 index (no re-tokenizing on import)
+
+The CLI export must run while nothing is ingesting (e.g. backend stopped).
+POST /snapshot/export on a running backend takes the ingestion lock instead.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import tarfile
+import argparse
+sys.path.append('.')
+
+from config.settings import (
+    EMBEDDING_MODEL, VECTOR_BACKEND, COLLECTION_NAME,
+    SNAPSHOT_DIR, REPLICA_DIR, SNAPSHOT_COMPRESSLEVEL, REPLICA_KEEP,
+)
+from vector_index import INDEX_FOLDERS, index_path, get_vector_index
+from keyword_index import KeywordIndex
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_META = "snapshot.json"
+
+
+# ===== HELPERS =====
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(folder):
+    """{relative path: sha256} for every file under folder"""
+    sums = {}
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            sums[os.path.relpath(path, folder).replace(os.sep, "/")] = _sha256(path)
+    return sums
+
+
+def _copy_index(src, dst):
+    """
+    Copy index files; SQLite databases (chroma.sqlite3) go through the
+    SQLite backup API so the copy is a consistent point-in-time image
+    """
+    for root, _, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            if name.endswith(("-wal", "-shm", "-journal", ".tmp", ".lock")):
+                continue
+            source, target = os.path.join(root, name), os.path.join(target_root, name)
+            if name.endswith(".sqlite3"):
+                src_db, dst_db = sqlite3.connect(source), sqlite3.connect(target)
+                try:
+                    src_db.backup(dst_db)
+                finally:
+                    src_db.close()
+                    dst_db.close()
+            else:
+                shutil.copy2(source, target)
+
+
+# ===== EXPORT =====
+def export_snapshot(out_dir=SNAPSHOT_DIR, lock=None, index=None):
+    """
+    Write a snapshot artifact of the local index
+    lock: ingestion lock to hold while files are copied (stage1_ingestion.ingest_lock)
+    index: the open vector index (stage2_retrieval.vectortores); None opens the configured one
+    Returns: (artifact path, snapshot metadata)
+    """
+    from stage1_ingestion import load_manifest
+
+    if index is None:
+        if not os.path.exists(index_path(VECTOR_BACKEND)):
+            raise FileNotFoundError(f"No index to snapshot at {index_path(VECTOR_BACKEND)}")
+        index = get_vector_index(None)
+
+    os.makedirs(out_dir, exist_ok=True)
+    staging = os.path.join(out_dir, f".staging-{os.getpid()}-{int(time.time() * 1000)}")
+    os.makedirs(staging)
+
+    try:
+        # 1. Copy index + manifest and read the chunks (short critical section, no compression here)
+        print("📸 Copying index files...")
+        if lock is not None:
+            lock.acquire()
+        try:
+            if not os.path.exists(index.path):
+                raise FileNotFoundError(f"No index to snapshot at {index.path}")
+            _copy_index(index.path, index_path(index.name, base_dir=staging))
+            manifest = load_manifest()
+            all_docs_data = index.get()
+        finally:
+            if lock is not None:
+                lock.release()
+
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # 2. Build the BM25 index from the same chunks
+        print("🔤 Building keyword index...")
+        KeywordIndex(all_docs_data["ids"], all_docs_data["documents"], all_docs_data["metadatas"]).save(staging)
+        chunks = len(all_docs_data["ids"])
+        del all_docs_data
+
+        # 3. Metadata + checksums
+        created_at = time.time()
+        name = f"rag-snapshot-v{manifest['version']}-{time.strftime('%Y%m%d-%H%M%S', time.gmtime(created_at))}"
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "name": name,
+            "corpus_version": manifest["version"],
+            "created_at": created_at,
+            "vector_backend": index.name,
+            "collection": COLLECTION_NAME,
+            "embedding_model": EMBEDDING_MODEL,
+            "chunks": chunks,
+            "files": _checksums(staging),
+        }
+        with open(os.path.join(staging, SNAPSHOT_META), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # 4. Compress (snapshot.json first so import can validate before extracting)
+        print("🗜️ Compressing snapshot...")
+        artifact = os.path.join(out_dir, name + ".tar.gz")
+        tmp = artifact + ".tmp"
+        with tarfile.open(tmp, "w:gz", compresslevel=SNAPSHOT_COMPRESSLEVEL) as tar:
+            tar.add(os.path.join(staging, SNAPSHOT_META), arcname=SNAPSHOT_META)
+            for rel_path in sorted(meta["files"]):
+                tar.add(os.path.join(staging, rel_path), arcname=rel_path)
+        os.replace(tmp, artifact)
+
+        meta.pop("files")
+        meta["artifact"] = artifact
+        meta["size_bytes"] = os.path.getsize(artifact)
+        print(f"✅ Snapshot saved: {artifact} ({meta['chunks']} chunks, corpus v{meta['corpus_version']})")
+        return artifact, meta
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+# ===== IMPORT =====
+def _read_meta(tar):
+    member = tar.next()
+    if member is None or member.name != SNAPSHOT_META:
+        raise ValueError("Not a RAG snapshot (snapshot.json missing)")
+    meta = json.load(tar.extractfile(member))
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {meta.get('format')}")
+    if meta["embedding_model"] != EMBEDDING_MODEL:
+        raise ValueError(f"Snapshot embedded with {meta['embedding_model']}, this node uses {EMBEDDING_MODEL}")
+    if meta["vector_backend"] not in INDEX_FOLDERS:
+        raise ValueError(f"Unknown vector backend in snapshot: {meta['vector_backend']}")
+    return meta
+
+
+def import_snapshot(artifact, replicas_dir=REPLICA_DIR):
+    """
+    Extract and verify a snapshot into replicas_dir/<name>/
+    Already-imported snapshots are reused as-is
+    Returns: (replica folder, snapshot metadata)
+    """
+    with tarfile.open(artifact, "r:gz") as tar:
+        meta = _read_meta(tar)
+        target = os.path.join(replicas_dir, meta["name"])
+        if os.path.exists(os.path.join(target, SNAPSHOT_META)):
+            print(f"✅ Snapshot already imported: {target}")
+            return target, meta
+
+        print(f"📦 Importing snapshot {meta['name']}...")
+        staging = target + ".importing"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            for member in tar:
+                if member.name == SNAPSHOT_META:
+                    continue
+                if not member.isfile() or member.name not in meta["files"]:
+                    raise ValueError(f"Unexpected entry in snapshot: {member.name}")
+                tar.extract(member, staging, filter="data")
+
+            for rel_path, digest in meta["files"].items():
+                if _sha256(os.path.join(staging, rel_path)) != digest:
+                    raise ValueError(f"Checksum mismatch: {rel_path}")
+
+            with open(os.path.join(staging, SNAPSHOT_META), "w") as f:
+                json.dump(meta, f, indent=2)
+            os.replace(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    print(f"✅ Snapshot imported: {target}")
+    return target, meta
+
+
+def open_replica(replica_dir, embedding_model):
+    """
+    Open an imported snapshot for serving
+    Returns: (vector index, keyword index, manifest path, snapshot metadata)
+    """
+    with open(os.path.join(replica_dir, SNAPSHOT_META)) as f:
+        meta = json.load(f)
+    meta.pop("files", None)
+    meta["path"] = replica_dir
+
+    index = get_vector_index(embedding_model, backend=meta["vector_backend"], base_dir=replica_dir)
+    keyword_index = KeywordIndex.load(replica_dir)
+    return index, keyword_index, os.path.join(replica_dir, "manifest.json"), meta
+
+
+def prune_replicas(keep_dirs, replicas_dir=REPLICA_DIR, keep=REPLICA_KEEP):
+    """Delete old imported snapshots, never touching keep_dirs (active/previous)"""
+    if not os.path.isdir(replicas_dir):
+        return
+    keep_dirs = {os.path.abspath(d) for d in keep_dirs if d}
+    folders = sorted(
+        (os.path.join(replicas_dir, name) for name in os.listdir(replicas_dir)),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for folder in folders[keep:]:
+        if os.path.abspath(folder) not in keep_dirs:
+            shutil.rmtree(folder, ignore_errors=True)
+            print(f"🧹 Removed old snapshot: {folder}")
+
+
+# ===== MAIN: CLI =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export/import RAG index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="Write a snapshot of the local index")
+    export_cmd.add_argument("--out", default=SNAPSHOT_DIR, help="Output folder")
+    import_cmd = commands.add_parser("import", help="Extract and verify a snapshot")
+    import_cmd.add_argument("artifact", help="Snapshot .tar.gz")
+    import_cmd.add_argument("--dest", default=REPLICA_DIR, help="Replica folder")
+    args = parser.parse_args()
+
+    print("="*60)
+    if args.command == "export":
+        print("📸 SNAPSHOT EXPORT")
+        print("="*60)
+        export_snapshot(args.out)
+    else:
+        print("📦 SNAPSHOT IMPORT")
+        print("="*60)
+        folder, meta = import_snapshot(args.artifact, args.dest)
+        print(f"▶️ Serve it: RAG_REPLICA_SNAPSHOT={args.artifact} python src/backend.py")
@@ -1,19 +1,99 @@
 import os 
 import sys
+import json
+import time
+import threading
 sys.path.append(".")
 
-from config.settings import DATA_PATH, DB_PATH, EMBEDDING_MODEL, CHUNK_OVERLAP, CHUNK_SIZE
+from config.settings import DATA_PATH, DB_PATH, MANIFEST_PATH, EMBEDDING_MODEL, CHUNK_OVERLAP, CHUNK_SIZE, VECTOR_BACKEND, INGEST_BATCH_SIZE
 
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 import chromadb
-import shutil
+
+from vector_index import get_vector_index, reset_vector_index
+from scheduler import scheduler
+
+
+# ===== HELPER: FILTERABLE METADATA =====
+def add_filter_metadata(chunks, doc_type="contract"):
+    """
+    Tag chunks with metadata used by filtered retrieval:
+    source_name (file name), doc_type, ingested_at (unix time)
+    PyPDFLoader already sets source (path) and page
+    """
+    ingested_at = time.time()
+    for chunk in chunks:
+        chunk.metadata["source_name"] = os.path.basename(chunk.metadata.get("source", ""))
+        chunk.metadata["doc_type"] = doc_type
+        chunk.metadata["ingested_at"] = ingested_at
+    return chunks
+
+
+# Held while the index/manifest are written, so snapshot export sees a consistent state
+ingest_lock = threading.RLock()
+
+
+# ===== HELPER: BACKGROUND EMBEDDING =====
+def add_in_batches(vector_index, chunks, batch_size=INGEST_BATCH_SIZE):
+    """
+    Embed + store chunks in small background jobs
+    Waiting queries run between batches, so uploads don't stall /ask
+    """
+    for start in range(0, len(chunks), batch_size):
+        with scheduler.background():
+            vector_index.add_documents(chunks[start:start + batch_size])
+    return len(chunks)
+
+
+# ===== HELPER: INGESTION MANIFEST =====
+def load_manifest(manifest_path=MANIFEST_PATH):
+    """
+    Manifest of what is indexed:
+    {"version": int, "updated_at": unix time, "files": {name: {"chunks", "doc_type", "ingested_at"}}}
+    version increases on every change, so caches can key on it
+    """
+    if not os.path.exists(manifest_path):
+        return {"version": 0, "updated_at": None, "files": {}}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def update_manifest(files=None, reset=False):
+    """Record ingested files (or reset to empty) and bump the corpus version"""
+    manifest = load_manifest()
+    if reset:
+        manifest["files"] = {}
+    manifest["files"].update(files or {})
+    manifest["version"] += 1
+    manifest["updated_at"] = time.time()
+    
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+    return manifest
+
+
+def get_corpus_version(manifest_path=MANIFEST_PATH):
+    """Current corpus version (changes whenever the index changes)"""
+    return load_manifest(manifest_path)["version"]
+
+
+def _manifest_entries(chunks, doc_type):
+    """Per-file chunk counts for the manifest"""
+    entries = {}
+    for chunk in chunks:
+        name = chunk.metadata["source_name"]
+        entry = entries.setdefault(name, {"chunks": 0, "doc_type": doc_type, "ingested_at": chunk.metadata["ingested_at"]})
+        entry["chunks"] += 1
+    return entries
 
 
 # ===== FUNCTION 1: BULK LOAD (Your original code) =====
-def bulk_load_pdfs():
+def bulk_load_pdfs(doc_type="contract"):
     """Load all PDFs from data folder and create fresh database"""
     
     print("📂 Loading PDFs from folder...")
@@ -40,10 +120,11 @@ def bulk_load_pdfs():
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         length_function=len,
+        add_start_index=True,  # Lets context packing merge overlapping chunks
         separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""],
     )
     
-    chunks = text_splitter.split_documents(documents)
+    chunks = add_filter_metadata(text_splitter.split_documents(documents), doc_type)
     print(f"✅ Created {len(chunks)} intelligent chunks")
     print(f"📊 Chunk sizes: {min(len(c.page_content) for c in chunks)} - {max(len(c.page_content) for c in chunks)} chars")
     
@@ -60,29 +141,26 @@ def bulk_load_pdfs():
     # Save to database (clean first)
     print("💾 Saving to database...")
     
-    if os.path.exists(DB_PATH):
-        shutil.rmtree(DB_PATH)
+    with ingest_lock:
+        reset_vector_index()
         print("🧹 Past data cleaned")
+        
+        vector_index = get_vector_index(embedding_model)
+        add_in_batches(vector_index, chunks)
+        update_manifest(_manifest_entries(chunks, doc_type), reset=True)
     
-    chroma_client = chromadb.PersistentClient(path=DB_PATH)
-    vectorstore = Chroma.from_documents(
-        documents=chunks,
-        embedding=embedding_model,
-        client=chroma_client,
-        collection_name="contracts_collection"
-    )
-    
-    print(f"✅ DATABASE SAVED: {DB_PATH}")
+    print(f"✅ DATABASE SAVED: {vector_index.path} ({vector_index.name})")
     print(f"🔍 {len(chunks)} chunks indexed and searchable!")
     
     return len(chunks)
 
 
 # ===== FUNCTION 2: SINGLE PDF UPLOAD (NEW!) =====
-def ingest_single_pdf(pdf_path):
+def ingest_single_pdf(pdf_path, doc_type="contract"):
     """
     Add a single PDF to existing database (no cleanup)
     Used by /upload endpoint
+    doc_type is stored on every chunk for filtered retrieval
     Returns: number of chunks added
     """
     print(f"\n📄 Processing uploaded PDF: {pdf_path}")
@@ -97,9 +175,10 @@ def ingest_single_pdf(pdf_path):
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
         length_function=len,
+        add_start_index=True,  # Lets context packing merge overlapping chunks
         separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""],
     )
-    chunks = text_splitter.split_documents(documents)
+    chunks = add_filter_metadata(text_splitter.split_documents(documents), doc_type)
     print(f"✂️ Split into {len(chunks)} chunks")
     
     # Connect to EXISTING database
@@ -108,25 +187,16 @@ def ingest_single_pdf(pdf_path):
         model_kwargs={'device': 'cpu'}
     )
     
-    chroma_client = chromadb.PersistentClient(path=DB_PATH)
-    
-    # Get existing collection (don't create new one)
-    collection = chroma_client.get_or_create_collection(
-        name="contracts_collection",
-        metadata={"hnsw:space": "cosine"}
-    )
-    
-    # Add chunks to existing collection
-    vectorstore = Chroma(
-        client=chroma_client,
-        collection_name="contracts_collection",
-        embedding_function=embedding_model
-    )
-    
-    vectorstore.add_documents(chunks)
+    with ingest_lock:
+        # Open existing index (created with HNSW settings if missing)
+        vector_index = get_vector_index(embedding_model)
+        
+        # Add chunks to existing index
+        add_in_batches(vector_index, chunks)
+        update_manifest(_manifest_entries(chunks, doc_type))
     
     print(f"✅ Added {len(chunks)} chunks to database")
-    print(f"📦 Total chunks in DB: {collection.count()}")
+    print(f"📦 Total chunks in DB: {vector_index.count()}")
     
     return len(chunks)
 
@@ -139,18 +209,10 @@ def clear_database():
     """
     print("\n🧹 Clearing vector database...")
     
-    if os.path.exists(DB_PATH):
-        shutil.rmtree(DB_PATH)
-        print("✅ Database cleared successfully")
-    else:
-        print("⚠️ Database doesn't exist")
-    
-    # Recreate empty database
-    chroma_client = chromadb.PersistentClient(path=DB_PATH)
-    chroma_client.get_or_create_collection(
-        name="contracts_collection",
-        metadata={"hnsw:space": "cosine"}
-    )
+    # Delete and recreate empty index
+    with ingest_lock:
+        reset_vector_index()
+        update_manifest(reset=True)
     print("📦 Empty database created")
 
 
@@ -161,6 +223,18 @@ def get_database_stats():
     Returns: dict with stats
     """
     try:
+        if VECTOR_BACKEND != "chroma":
+            vector_index = get_vector_index(embedding_model=None)
+            index_stats = vector_index.stats()
+            return {
+                "exists": True,
+                "db_path": vector_index.path,
+                "total_chunks": index_stats["chunks"],
+                "collections": [],
+                "index": index_stats,
+                "corpus_version": get_corpus_version()
+            }
+        
         if not os.path.exists(DB_PATH):
             return {
                 "exists": False,
@@ -187,6 +261,7 @@ def get_database_stats():
             })
         
         stats["total_chunks"] = total_chunks
+        stats["corpus_version"] = get_corpus_version()
         
         return stats
     
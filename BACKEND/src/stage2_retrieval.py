@@ -4,24 +4,39 @@ sys.path.append('.')
 
 
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_ollama import ChatOllama
-from config.settings import EMBEDDING_MODEL,DB_PATH
-import chromadb  # CHANGED: Added chromadb import to use PersistentClient pattern
+from config.settings import EMBEDDING_MODEL, OLLAMA_HOST, OLLAMA_MODEL, OLLAMA_KEEP_ALIVE, MANIFEST_PATH, MULTI_QUERY_COUNT
+from config.settings import INGEST_BATCH_SIZE
+from vector_index import get_vector_index
+from scheduler import scheduler
 
 
 embedding_model=HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-# CHANGED: Use PersistentClient to avoid file lock issues and "File exists (os error 17)" error
-chroma_client = chromadb.PersistentClient(path=DB_PATH)  # CHANGED: Create client first
-vectortores= Chroma(
-    client=chroma_client,  # CHANGED: Use client parameter instead of persist_directory
-    collection_name="contracts_collection",  # CHANGED: Added explicit collection name for consistency
-    embedding_function=embedding_model
-)
+# Backend (chroma HNSW / mmap flat) and its tuning come from config/settings.py
+vectortores = get_vector_index(embedding_model)
+print(f"✅ Vector index: {vectortores.name}")
+
+
+def embed_texts(texts, background=False):
+    """
+    Embed query-side texts in one batch, as interactive (priority) CPU work
+    background=True (offline /ask/batch): small background jobs, so live queries cut in
+    """
+    if not background:
+        with scheduler.interactive():
+            return embedding_model.embed_documents(texts)
+    
+    embeddings = []
+    for start in range(0, len(texts), INGEST_BATCH_SIZE):
+        with scheduler.background():
+            embeddings.extend(embedding_model.embed_documents(texts[start:start + INGEST_BATCH_SIZE]))
+    return embeddings
 
 llm=ChatOllama(  # CHANGED: Fixed typo from chatOllama to ChatOllama (case-sensitive)
-    model="llama3.2:3b",
-    temperature=0.6
+    model=OLLAMA_MODEL,
+    base_url=OLLAMA_HOST,
+    temperature=0.6,
+    keep_alive=OLLAMA_KEEP_ALIVE  # Model stays loaded so the shared prompt prefix is reused
 )
 
 print("✅ Ollama LLM connected!")
@@ -30,18 +45,18 @@ print("🚀 Ready for query optimization!")
 #Queary rewriting 
 print("Queary rewriting ")
 
+type_prompts={
+    "contract": "Use formal legal/contract terminology",
+    "medical": "Use medical terminology, lab values, diagnoses", 
+    "code": "Use programming terms, functions, parameters",
+    "recipe": "Use cooking terms, ingredients, steps",
+    "general": "Use clear, detailed language"
+}
+
 def  rewrite_query(user_question,document_type='general'):
     """
         ANY document type → Smart rewriting
     """
-    type_prompts={
-        "contract": "Use formal legal/contract terminology",
-        "medical": "Use medical terminology, lab values, diagnoses", 
-        "code": "Use programming terms, functions, parameters",
-        "recipe": "Use cooking terms, ingredients, steps",
-        "general": "Use clear, detailed language"
-    }
-    
     context = type_prompts.get(document_type, type_prompts["general"])
     
     prompt = f"""Rewrite this question for document search.
@@ -54,14 +69,15 @@ def  rewrite_query(user_question,document_type='general'):
     response = llm.invoke(prompt)
     return response.content.strip()
     
+# ===== 2.1b METADATA FILTERS =====
+from metadata_filters import build_where  # /ask filters → `where` clause (kept importable from here)
+
+
 # ===== 2.2 HyDE (Hypothetical Document Embeddings) =====
 print("\n🎭 2.2 HyDE - Fake Document Magic...")
 
-def hyde_retrieve(user_question, k=5):
-    """
-    HyDE: Generate fake answer → Embed fake → Find real matches
-    """
-    # Step 1: Use LLM to generate "fake ideal answer"
+def generate_hypothetical(user_question):
+    """HyDE step 1: LLM writes a "fake ideal answer" to embed instead of the question"""
     hyde_prompt = f"""Pretend you have perfect knowledge of the document.
 Write a detailed answer to this question as if you found it in the document.
 
@@ -71,14 +87,25 @@ Fake document answer (2-3 sentences):"""
     
     fake_answer = llm.invoke(hyde_prompt).content.strip()
     print(f"   🎭 Fake answer: {fake_answer[:80]}...")
+    return fake_answer
+
+
+def hyde_retrieve(user_question, k=5, where=None):
+    """
+    HyDE: Generate fake answer → Embed fake → Find real matches
+    where: optional metadata filter from build_where()
+    """
+    # Step 1: Use LLM to generate "fake ideal answer"
+    fake_answer = generate_hypothetical(user_question)
     
-    # Step 2: Embed the FAKE answer (not user question)
-    fake_embedding = embedding_model.embed_query(fake_answer)
-    
-    # Step 3: Search database using fake embedding
-    results = vectortores.similarity_search_by_vector(fake_embedding, k)  # CHANGED: Fixed typo vectorstore -> vectortores
-    
-    return results
+    # Step 2 + 3: Embed the FAKE answer (not user question) and search with it
+    return hyde_search_batch([fake_answer], k, where=where)[0]
+
+
+def hyde_search_batch(fake_answers, k=5, where=None, background=False):
+    """HyDE steps 2 + 3 for many fake answers: one embedding batch, one index query"""
+    fake_embeddings = embed_texts(fake_answers, background)
+    return vectortores.similarity_search_by_vectors(fake_embeddings, k, where=where)  # CHANGED: Fixed typo vectorstore -> vectortores
 
 print("✅ HyDE ready!")
 
@@ -86,42 +113,158 @@ print("✅ HyDE ready!")
 # ===== 2.3 HYBRID SEARCH =====
 print("\n🔍 2.3 Hybrid Search...")
 
-from rank_bm25 import BM25Okapi
-import nltk
-nltk.download('punkt', quiet=True)
+import threading
+from keyword_index import KeywordIndex
+
+# BM25 index is built once per corpus version, not once per query
+_keyword_cache = {"version": None, "index": None}
+_keyword_lock = threading.Lock()
+
+
+def get_keyword_index():
+    """BM25 index over every stored chunk, rebuilt when the corpus version changes"""
+    version = current_corpus_version()
+    with _keyword_lock:
+        if _keyword_cache["index"] is None or _keyword_cache["version"] != version:
+            all_docs_data = vectortores.get()
+            _keyword_cache["index"] = KeywordIndex(
+                all_docs_data['ids'], all_docs_data['documents'], all_docs_data['metadatas']
+            )
+            _keyword_cache["version"] = version
+            print(f"   🔤 BM25 index built: {len(_keyword_cache['index'])} chunks")
+        return _keyword_cache["index"]
 
-def hybrid_search(user_question, k=5):
+
+def fuse_results(result_lists, k=5):
+    """Reciprocal Rank Fusion of several ranked Document lists → top k"""
+    doc_scores = {}
+    docs_by_id = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            doc_id = hash(doc.page_content)  # Unique ID
+            docs_by_id.setdefault(doc_id, doc)
+            doc_scores[doc_id] = doc_scores.get(doc_id, 0) + 1 / (k + rank + 1)
+    
+    top_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:k]
+    return [docs_by_id[doc_id] for doc_id, score in top_docs]
+
+
+def hybrid_search(user_question, k=5, where=None):
     """
     Vector (meaning) + BM25 (keywords) = Perfect results
+    where: optional metadata filter, applied inside both searches
+    """
+    return hybrid_search_batch([user_question], k, where=where)[0]
+
+
+def hybrid_search_batch(user_questions, k=5, where=None, background=False):
+    """
+    Hybrid search for many questions at once:
+    one embedding batch, one vector query, one vectorized BM25 pass
+    background: embed as low-priority work (see embed_texts)
     """
     # 1. Vector search (semantic)
-    vector_docs = vectortores.similarity_search(user_question, k=k*2)  # CHANGED: Fixed typo vectorstore -> vectortores
+    query_embeddings = embed_texts(user_questions, background)
+    vector_results = vectortores.similarity_search_by_vectors(query_embeddings, k=k*2, where=where)
     
-    # 2. BM25 keyword search
-    # CHANGED: Get all documents from vectorstore properly - get() returns strings directly
-    all_docs_data = vectortores.get()
-    all_texts = all_docs_data['documents']  # These are already strings, not Document objects
-    tokenized_docs = [nltk.word_tokenize(text.lower()) for text in all_texts]
-    bm25 = BM25Okapi(tokenized_docs)
+    # 2. BM25 keyword search (only over chunks matching the filter)
+    keyword_results = get_keyword_index().search(user_questions, k=k*2, where=where)
     
-    query_tokens = nltk.word_tokenize(user_question.lower())
-    bm25_scores = bm25.get_scores(query_tokens)
+    # 3. Combine ranks (Reciprocal Rank Fusion) → top k
+    return [fuse_results([vector_docs, keyword_docs], k)
+            for vector_docs, keyword_docs in zip(vector_results, keyword_results)]
+
+print("✅ Hybrid Search ready!")
+
+
+# ===== 2.5 MULTI-QUERY EXPANSION =====
+print("\n🔀 2.5 Multi-Query Expansion...")
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Vector and keyword searches of one request run side by side here
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="search")
+
+
+def generate_sub_queries(user_question, n=MULTI_QUERY_COUNT, document_type='general'):
+    """
+    ONE LLM call → n search queries covering different parts of the question
+    Returns: [original question] + sub-queries (duplicates removed)
+    """
+    context = type_prompts.get(document_type, type_prompts["general"])
+    prompt = f"""Split this question into {n} different search queries for document search.
+Cover every part of the question and use different wording for each.
+Context: {context}
+
+Question: {user_question}
+
+Write exactly {n} queries, one per line, no numbering:"""
     
-    # 3. Combine scores (Reciprocal Rank Fusion)
-    doc_scores = {}
-    for i, doc in enumerate(vector_docs):
-        doc_id = hash(doc.page_content)  # Unique ID
-        doc_scores[doc_id] = 1 / (k + i + 1)  # Vector score
+    response = llm.invoke(prompt).content.strip()
     
-    bm25_docs = sorted(enumerate(bm25_scores), key=lambda x: x[1], reverse=True)[:k*2]
-    for rank, score in bm25_docs:
-        doc_id = hash(all_texts[rank])
-        doc_scores[doc_id] = doc_scores.get(doc_id, 0) + score
+    queries = [user_question]
+    seen = {user_question.lower()}
+    for line in response.splitlines():
+        query = re.sub(r'^\s*(?:\d+[.)]|[-*•])\s*', '', line).strip().strip('"')
+        if query and query.lower() not in seen:
+            seen.add(query.lower())
+            queries.append(query)
+        if len(queries) == n + 1:
+            break
+    print(f"   🔀 Sub-queries: {queries[1:]}")
+    return queries
+
+
+def multi_query_retrieve(user_question, k=10, n=MULTI_QUERY_COUNT, where=None, document_type='general'):
+    """
+    Multi-query retrieval with close to single-query latency:
+    1 LLM call for all sub-queries, 1 embedding batch, vector + BM25 searches
+    in parallel, Reciprocal Rank Fusion of every result list
+    Returns: (top k fused chunks, queries used)
+    """
+    queries = generate_sub_queries(user_question, n, document_type)
     
-    # 4. Return top k combined
-    top_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:k]
-    return [vector_docs[hash(doc_id) % len(vector_docs)] for doc_id in [doc[0] for doc in top_docs]]
+    # BM25 needs no embeddings, so it starts while the batch is being embedded
+    keyword_future = _search_pool.submit(lambda: get_keyword_index().search(queries, k=k, where=where))
+    query_embeddings = embed_texts(queries)
+    vector_future = _search_pool.submit(vectortores.similarity_search_by_vectors, query_embeddings, k, where)
+    
+    result_lists = vector_future.result() + keyword_future.result()
+    return fuse_results(result_lists, k), queries
 
-print("✅ Hybrid Search ready!")
+print("✅ Multi-Query ready!")
+
+
+# ===== 2.4 ACTIVE INDEX (read replicas) =====
+# Which manifest describes the serving index: local ingestion, or a loaded snapshot
+_active = {"manifest_path": MANIFEST_PATH, "snapshot": None}
+
+
+def current_corpus_version():
+    """Corpus version of the index currently being served"""
+    from stage1_ingestion import get_corpus_version
+    return get_corpus_version(_active["manifest_path"])
+
+
+def active_snapshot():
+    """Metadata of the loaded snapshot (None when serving the local index)"""
+    return _active["snapshot"]
+
+
+def set_vector_index(index, manifest_path, keyword_index=None, snapshot=None):
+    """
+    Hot-swap the serving index (e.g. a newer snapshot on a replica)
+    The new index must be fully opened before calling; requests already
+    running keep using the old objects, new requests use the new ones
+    """
+    global vectortores
+    from stage1_ingestion import get_corpus_version
+    version = get_corpus_version(manifest_path)
+    with _keyword_lock:
+        vectortores = index
+        _active.update({"manifest_path": manifest_path, "snapshot": snapshot})
+        _keyword_cache.update({"version": version, "index": keyword_index})
+    print(f"🔁 Serving index swapped: {index.name} @ {index.path} (corpus v{version})")
 
     
\ No newline at end of file
@@ -2,32 +2,31 @@
 import sys
 sys.path.append('..')
 
-from config.settings import DB_PATH, EMBEDDING_MODEL
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+from config.settings import RERANK_BATCH_SIZE
 from FlagEmbedding import FlagReranker  # CHANGED: Fixed import from flag_embedding to FlagEmbedding (correct case)
-import chromadb  # CHANGED: Added chromadb import for PersistentClient pattern
+from scheduler import scheduler
 
 print("✅ Stage 3 imports ready!")
 
-# CHANGED: Load Stage 2 database using PersistentClient to avoid file lock conflicts
-embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-chroma_client = chromadb.PersistentClient(path=DB_PATH)  # CHANGED: Create PersistentClient instance
-vectorstore = Chroma(
-    client=chroma_client,  # CHANGED: Use client parameter instead of persist_directory
-    collection_name="contracts_collection",  # CHANGED: Added explicit collection name matching stage2
-    embedding_function=embedding_model
-)
-
+# Candidates come from stage2_retrieval; this stage only needs the reranker
 # Reranker (AI judge)
 reranker = FlagReranker('BAAI/bge-reranker-base', use_fp16=False, device='cpu')
 
+def _score_list(scores):
+    """compute_score returns a bare float for a single pair"""
+    return scores if isinstance(scores, list) else [scores]
+
+
 def rerank_chunks(query, candidate_chunks, top_k=5):
     """20 messy chunks → Top 5 perfect chunks"""
     print(f"   📊 Reranking {len(candidate_chunks)} chunks...")
     
+    if not candidate_chunks:
+        return []
+    
     pairs = [[query, chunk.page_content] for chunk in candidate_chunks]
-    scores = reranker.compute_score(pairs)
+    with scheduler.interactive():  # Queries get CPU priority over ingestion
+        scores = _score_list(reranker.compute_score(pairs))
     
     # Sort by score
     scored = list(zip(candidate_chunks, scores))
@@ -38,4 +37,33 @@ def rerank_chunks(query, candidate_chunks, top_k=5):
     
     return top_chunks
 
+
+def rerank_chunks_batch(queries, candidate_lists, top_k=5, batch_size=RERANK_BATCH_SIZE):
+    """
+    Rerank candidates for many queries (offline /ask/batch)
+    All (query, chunk) pairs go through the model in batch_size slices, each its
+    own background job, so live /ask requests run between slices
+    Returns: top_k chunks per query
+    """
+    pairs = [[query, chunk.page_content]
+             for query, chunks in zip(queries, candidate_lists)
+             for chunk in chunks]
+    print(f"   📊 Reranking {len(pairs)} pairs for {len(queries)} queries...")
+    if not pairs:
+        return [[] for _ in queries]
+    
+    scores = []
+    for start in range(0, len(pairs), batch_size):
+        with scheduler.background():
+            scores.extend(_score_list(reranker.compute_score(pairs[start:start + batch_size], batch_size=batch_size)))
+    
+    results = []
+    offset = 0
+    for chunks in candidate_lists:
+        scored = list(zip(chunks, scores[offset:offset + len(chunks)]))
+        offset += len(chunks)
+        scored.sort(key=lambda x: x[1], reverse=True)
+        results.append([chunk for chunk, score in scored[:top_k]])
+    return results
+
 print("✅ Reranker ready!")
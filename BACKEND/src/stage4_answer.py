@@ -1,72 +1,208 @@
 #stage4 building the answer
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 sys.path.append('.')
 
 # ===== STAGE 2 & 3 IMPORTS =====
-# CHANGED: Import vectortores and llm from stage2_retrieval to reuse instances
-from stage2_retrieval import rewrite_query, hyde_retrieve, hybrid_search, vectortores, llm  
-from stage3_rerank import rerank_chunks  
+# CHANGED: Import llm from stage2_retrieval to reuse the instance
+from stage2_retrieval import (rewrite_query, hyde_retrieve, hybrid_search, build_where, llm,
+                              generate_hypothetical, hyde_search_batch, hybrid_search_batch,
+                              multi_query_retrieve)
+from stage3_rerank import rerank_chunks, rerank_chunks_batch
+from context_packing import pack_context
+from config.settings import BATCH_LLM_CONCURRENCY, BATCH_WAVE_SIZE, RETRIEVAL_MODE
 
+# Fixed instructions come FIRST and never change, so Ollama can reuse the
+# evaluated prefix across requests; per-request context/question go last.
+ANSWER_PROMPT_PREFIX = """Answer using ONLY this context. Be precise. Cite sections.
+Each context block starts with its [source, page] label.
 
-from  langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_ollama import ChatOllama
-from config.settings import DB_PATH,EMBEDDING_MODEL
+Context:
+"""
+
+
+def build_answer_prompt(question, context):
+    """Stable prefix + packed context + question"""
+    return f"""{ANSWER_PROMPT_PREFIX}{context}
+
+Question: {question}
+
+Answer:"""
+
+
+NO_MATCH_ANSWER = "No matching documents found for this question and filters."
+
+
+def unique_chunks(chunks):
+    """Drop duplicate chunks (same text), keeping first occurrence"""
+    unique = []
+    seen = set()
+    for chunk in chunks:
+        content_hash = hash(chunk.page_content)
+        if content_hash not in seen:
+            seen.add(content_hash)
+            unique.append(chunk)
+    return unique
+
+
+def generate_answer(question, rewritten, top_chunks):
+    """Pack context (merge overlaps, keep relevant sentences, fit token budget) → LLM answer"""
+    context = pack_context(f"{question} {rewritten}", top_chunks)
+    prompt = build_answer_prompt(question, context)
+    return llm.invoke(prompt).content.strip()
 
-# CHANGED: Reuse the vectorstore and llm from stage2_retrieval to avoid multiple ChromaDB instances
-# This prevents "File exists (os error 17)" error caused by multiple connections
-embedding_model=HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL )
-vectorstore = vectortores  # CHANGED: Use the already initialized instance instead of creating new Chroma instance
 
 # ===== ENHANCED FULL RAG =====
-def full_rag_pipeline(question, doc_type="contract"):
+RETRIEVAL_MODES = ("hyde_hybrid", "multi_query")
+
+
+def full_rag_pipeline(question, doc_type="contract", filters=None, mode=RETRIEVAL_MODE):
     """
     ULTIMATE RAG: HyDE + Hybrid + Rerank!
+    filters: optional metadata filters (see build_where), searched inside the index
+    mode: "hyde_hybrid" (rewrite + HyDE + hybrid) or "multi_query" (sub-queries + fused search)
     """
     print(f"\n🚀 ULTIMATE RAG PIPELINE:")
     print(f"Question: {question}")
     
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown mode: {mode} (use one of {', '.join(RETRIEVAL_MODES)})")
+    
+    where = build_where(filters)  # Raises ValueError on bad filters
+    if where:
+        print(f"🔎 Filter: {where}")
+    
+    if mode == "multi_query":
+        return multi_query_pipeline(question, doc_type, where)
+    
     # 1. Smart rewrite
     rewritten = rewrite_query(question, doc_type)
     print(f"📝 Rewritten: {rewritten[:80]}...")
     
     # 2. HyDE retrieval (20 docs)
-    hyde_chunks = hyde_retrieve(rewritten, k=10)
+    hyde_chunks = hyde_retrieve(rewritten, k=10, where=where)
     print(f"🎭 HyDE retrieved: {len(hyde_chunks)} chunks")
     
     # 3. Hybrid search (20 docs)
-    hybrid_chunks = hybrid_search(rewritten, k=10)
+    hybrid_chunks = hybrid_search(rewritten, k=10, where=where)
     print(f"🔍 Hybrid retrieved: {len(hybrid_chunks)} chunks")
     
     # 4. COMBINE both results (remove duplicates)
-    all_chunks = hyde_chunks + hybrid_chunks
-    unique_chunks = []
-    seen = set()
-    for chunk in all_chunks:
-        content_hash = hash(chunk.page_content)
-        if content_hash not in seen:
-            seen.add(content_hash)
-            unique_chunks.append(chunk)
+    candidates = unique_chunks(hyde_chunks + hybrid_chunks)
     
-    print(f"📦 Total unique chunks: {len(unique_chunks)}")
+    print(f"📦 Total unique chunks: {len(candidates)}")
+    if not candidates:
+        return NO_MATCH_ANSWER
     
     # 5. Rerank combined results (top 5)
-    top_chunks = rerank_chunks(rewritten, unique_chunks, top_k=5)
+    top_chunks = rerank_chunks(rewritten, candidates, top_k=5)
     print(f"⭐ Top 5 after reranking")
     
-    # 6. Generate answer
-    context = "\n\n".join([c.page_content for c in top_chunks])
-    prompt = f"""Answer using ONLY this context. Be precise. Cite sections.
+    # 6. Pack context + generate answer
+    answer = generate_answer(question, rewritten, top_chunks)
+    return answer
 
-Context:
-{context}
 
-Question: {question}
+def multi_query_pipeline(question, doc_type, where):
+    """Multi-query retrieval → rerank against the ORIGINAL question → answer"""
+    # 1-3. Sub-queries (1 LLM call) + batched embedding + parallel fused search
+    candidates, queries = multi_query_retrieve(question, k=20, where=where, document_type=doc_type)
+    print(f"🔀 Multi-query retrieved: {len(candidates)} chunks from {len(queries)} queries")
+    if not candidates:
+        return NO_MATCH_ANSWER
+    
+    # 4. Rerank fused results (top 5)
+    top_chunks = rerank_chunks(question, candidates, top_k=5)
+    print("⭐ Top 5 after reranking")
+    
+    # 5. Pack context + generate answer
+    return generate_answer(question, " ".join(queries[1:]), top_chunks)
 
-Answer:"""
+
+# ===== BATCH RAG =====
+def full_rag_pipeline_batch(questions, doc_type="contract", filters=None, max_concurrency=BATCH_LLM_CONCURRENCY,
+                            wave_size=BATCH_WAVE_SIZE):
+    """
+    Same pipeline as full_rag_pipeline for many questions, sharing the heavy work:
+    - LLM calls (rewrite, HyDE, answer) run max_concurrency at a time
+    - Questions are retrieved + reranked in waves of wave_size: one embedding batch,
+      one vectorized BM25 pass and large reranker batches per wave
+    - The next wave is rewritten while the current one is searched, and a wave's
+      answers are generated while later waves are still being prepared
+    Yields {"index", "question", "answer"} (or "error") as each answer completes
+    """
+    print(f"\n🚀 BATCH RAG PIPELINE: {len(questions)} questions")
     
-    answer = llm.invoke(prompt).content.strip()
-    return answer
+    where = build_where(filters)  # Raises ValueError on bad filters
+    
+    def prepare(question):
+        rewritten = rewrite_query(question, doc_type)
+        return rewritten, generate_hypothetical(rewritten)
+    
+    def answer(index, rewritten, top_chunks):
+        if not top_chunks:
+            return NO_MATCH_ANSWER
+        return generate_answer(questions[index], rewritten, top_chunks)
+    
+    waves = [range(start, min(start + wave_size, len(questions))) for start in range(0, len(questions), wave_size)]
+    pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    prepare_futures = {}
+    answer_futures = {}
+    
+    def submit_prepare(wave):
+        prepare_futures.update((index, pool.submit(prepare, questions[index])) for index in wave)
+    
+    def finished_answers(wait):
+        """Answers done so far (wait=False) or all remaining ones as they complete"""
+        done = as_completed(list(answer_futures)) if wait else [f for f in list(answer_futures) if f.done()]
+        for future in done:
+            index = answer_futures.pop(future)
+            try:
+                yield {"index": index, "question": questions[index], "answer": future.result(), "status": "success"}
+            except Exception as e:
+                yield {"index": index, "question": questions[index], "error": str(e), "status": "failed"}
+    
+    try:
+        if waves:
+            submit_prepare(waves[0])
+        for number, wave in enumerate(waves):
+            # 1. Rewrite + HyDE fake answer per question (LLM), one wave ahead
+            if number + 1 < len(waves):
+                submit_prepare(waves[number + 1])
+            prepared = {}
+            for index in wave:
+                try:
+                    prepared[index] = prepare_futures.pop(index).result()
+                except Exception as e:
+                    yield {"index": index, "question": questions[index], "error": str(e), "status": "failed"}
+            
+            live = sorted(prepared)
+            if live:
+                rewritten = [prepared[index][0] for index in live]
+                fake_answers = [prepared[index][1] for index in live]
+                
+                # 2. Shared retrieval: HyDE + hybrid for the whole wave
+                # Offline work: torch runs as background jobs so live /ask keeps priority
+                hyde_results = hyde_search_batch(fake_answers, k=10, where=where, background=True)
+                hybrid_results = hybrid_search_batch(rewritten, k=10, where=where, background=True)
+                candidate_lists = [unique_chunks(hyde_chunks + hybrid_chunks)
+                                   for hyde_chunks, hybrid_chunks in zip(hyde_results, hybrid_results)]
+                print(f"📦 Wave {number + 1}/{len(waves)}: {sum(len(c) for c in candidate_lists)} candidate chunks")
+                
+                # 3. Batched rerank for the wave (background slices)
+                top_lists = rerank_chunks_batch(rewritten, candidate_lists, top_k=5)
+                
+                # 4. Queue the answers; they run alongside the next wave's preparation
+                for position, index in enumerate(live):
+                    answer_futures[pool.submit(answer, index, rewritten[position], top_lists[position])] = index
+            
+            # Stream whatever is already answered before starting the next wave
+            yield from finished_answers(wait=False)
+        
+        yield from finished_answers(wait=True)
+    finally:
+        # Client gone (generator closed) or done: drop queued LLM calls instead of waiting for them
+        pool.shutdown(cancel_futures=True)
 
 print("Full pipe line ready ")
 
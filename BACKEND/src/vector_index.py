@@ -0,0 +1,530 @@
+"""
+Vector index backends for ingestion and retrieval
+Usage: from vector_index import get_vector_index
+
+Backends (pick with VECTOR_BACKEND in config/settings.py):
+- "chroma": ChromaDB HNSW graph, tuned with HNSW_M / HNSW_EF_*
+- "mmap":   NumPy float16 vectors in a memory-mapped file,
+            exact (brute force) or IVF (clustered) search
+"""
+import os
+import sys
+import json
+import uuid
+import shutil
+import threading
+sys.path.append('.')
+
+import numpy as np
+import chromadb
+from langchain_core.documents import Document
+from langchain_community.vectorstores import Chroma
+
+from config.settings import (
+    DB_PATH, VECTOR_BACKEND, COLLECTION_NAME,
+    HNSW_SPACE, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    MMAP_INDEX_PATH, MMAP_SEARCH_MODE, IVF_NLIST, IVF_NPROBE,
+)
+from metadata_filters import FilterCache
+
+
+def hnsw_metadata():
+    """Collection metadata with the HNSW knobs from settings"""
+    return {
+        "hnsw:space": HNSW_SPACE,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_EF_CONSTRUCTION,
+        "hnsw:search_ef": HNSW_EF_SEARCH,
+    }
+
+
+# hnsw_metadata() key -> key in Chroma's collection configuration
+HNSW_CONFIG_KEYS = {
+    "hnsw:space": "space",
+    "hnsw:M": "max_neighbors",
+    "hnsw:construction_ef": "ef_construction",
+    "hnsw:search_ef": "ef_search",
+}
+
+
+# ===== BACKEND 1: CHROMA (HNSW) =====
+class ChromaIndex:
+    """HNSW index stored in ChromaDB"""
+
+    name = "chroma"
+
+    def __init__(self, embedding_model, path=DB_PATH):
+        self.path = path
+        self.embedding_model = embedding_model
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            metadata=hnsw_metadata()
+        )
+        self._apply_hnsw_settings()
+        self.store = Chroma(
+            client=self.client,
+            collection_name=COLLECTION_NAME,
+            embedding_function=embedding_model,
+            collection_metadata=hnsw_metadata()
+        )
+
+    def hnsw_config(self):
+        """HNSW parameters the collection actually uses, keyed like hnsw_metadata()"""
+        hnsw = (self.collection.configuration or {}).get("hnsw") or {}
+        return {key: hnsw.get(name) for key, name in HNSW_CONFIG_KEYS.items()}
+
+    def _apply_hnsw_settings(self):
+        """
+        Metadata only applies when the collection is created:
+        - ef_search can change on an existing collection → set it from settings
+        - space / M / ef_construction are fixed → warn, re-ingest to change them
+        """
+        actual, wanted = self.hnsw_config(), hnsw_metadata()
+        if actual["hnsw:search_ef"] != wanted["hnsw:search_ef"]:
+            self.collection.modify(configuration={"hnsw": {"ef_search": wanted["hnsw:search_ef"]}})
+            self.collection = self.client.get_collection(COLLECTION_NAME)
+
+        fixed = ("hnsw:space", "hnsw:M", "hnsw:construction_ef")
+        stale = [f"{key}={actual[key]} (settings: {wanted[key]})" for key in fixed if actual[key] != wanted[key]]
+        if stale:
+            print(f"⚠️ Collection '{COLLECTION_NAME}' was built with {', '.join(stale)}; "
+                  f"clear the database and re-ingest to apply the settings")
+
+    def add_documents(self, documents):
+        """Embed and add documents, returns number added"""
+        if documents:
+            self.store.add_documents(documents)
+        return len(documents)
+
+    def similarity_search(self, query, k=5, where=None):
+        return self.store.similarity_search(query, k=k, filter=where)
+
+    def similarity_search_by_vector(self, embedding, k=5, where=None):
+        return self.store.similarity_search_by_vector(embedding, k, filter=where)
+
+    def similarity_search_by_vectors(self, embeddings, k=5, where=None):
+        """Many query vectors in ONE Chroma query, returns one result list per vector"""
+        if not embeddings or not self.collection.count():
+            return [[] for _ in embeddings]
+        results = self.collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas"]
+        )
+        return [
+            [Document(page_content=text, metadata=metadata or {}, id=doc_id)
+             for doc_id, text, metadata in zip(ids, texts, metadatas)]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def get(self, where=None):
+        """Stored chunks matching `where`: {"ids", "documents", "metadatas"}"""
+        return self.store.get(where=where)
+
+    def count(self):
+        return self.collection.count()
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "chunks": self.count(),
+            "hnsw": self.hnsw_config()
+        }
+
+
+# ===== BACKEND 2: MEMORY-MAPPED FLOAT16 FLAT INDEX =====
+class _MmapState:
+    """One consistent load of the index files; published whole, never changed after"""
+
+    def __init__(self, mtime=None, dim=0, count=0, vectors=None, ids=(), texts=(), metadatas=(), ivf=None):
+        self.mtime = mtime
+        self.dim = dim
+        self.count = count
+        self.vectors = vectors
+        self.ids, self.texts, self.metadatas = ids, texts, metadatas
+        self.ivf = ivf
+        self.filter_cache = FilterCache()
+
+
+class MmapFlatIndex:
+    """
+    Flat index: float16 vectors in a memory-mapped file + JSONL chunk store
+
+    Files in the index folder:
+    - vectors.f16  raw float16 rows (count x dim), L2-normalized
+    - docs.jsonl   one {"id", "text", "metadata"} line per row
+    - header.json  {"dim", "count"} - written last, readers trust only this
+    - ivf.npz      k-means centroids + row assignments (IVF mode only)
+
+    Search is cosine similarity (dot product of normalized vectors).
+    "exact" scans every row, "ivf" only scans the IVF_NPROBE closest clusters.
+    A Chroma-style `where` filter restricts the scan to matching rows.
+
+    Loaded files live in one _MmapState that is swapped in a single step;
+    every search takes one reference to it, so a concurrent reload never
+    mixes old and new rows.
+    """
+
+    name = "mmap"
+    BLOCK_ROWS = 65536  # Rows converted to float32 at a time during a scan
+    MIN_ROWS_PER_LIST = 4  # Below IVF_NLIST * this, IVF falls back to exact
+
+    def __init__(self, embedding_model, path=MMAP_INDEX_PATH,
+                 search_mode=MMAP_SEARCH_MODE, nlist=IVF_NLIST, nprobe=IVF_NPROBE):
+        if search_mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown MMAP_SEARCH_MODE: {search_mode}")
+
+        self.path = path
+        self.embedding_model = embedding_model
+        self.search_mode = search_mode
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.RLock()  # Writers + state swaps
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_file = os.path.join(path, "vectors.f16")
+        self._docs_file = os.path.join(path, "docs.jsonl")
+        self._header_file = os.path.join(path, "header.json")
+        self._ivf_file = os.path.join(path, "ivf.npz")
+
+        self._state = _MmapState()
+        self._refresh()
+
+    # ----- loading -----
+    def _read_header(self):
+        if not os.path.exists(self._header_file):
+            return {"dim": 0, "count": 0}
+        with open(self._header_file) as f:
+            return json.load(f)
+
+    def _write_header(self, dim, count):
+        tmp = self._header_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        os.replace(tmp, self._header_file)
+
+    def _header_mtime(self):
+        return os.stat(self._header_file).st_mtime_ns if os.path.exists(self._header_file) else None
+
+    def _load_state(self, dim, count, mtime):
+        """Read the first `count` rows into a new state (not published)"""
+        state = _MmapState(mtime, dim, count)
+        if not count:
+            return state
+
+        state.vectors = np.memmap(self._vectors_file, dtype=np.float16, mode="r", shape=(count, dim))
+        ids, texts, metadatas = [], [], []
+        with open(self._docs_file) as f:
+            for line in f:
+                if len(ids) == count:
+                    break
+                row = json.loads(line)
+                ids.append(row["id"])
+                texts.append(row["text"])
+                metadatas.append(row["metadata"])
+        state.ids, state.texts, state.metadatas = ids, texts, metadatas
+        return state
+
+    def _refresh(self):
+        """Current state, reloaded first if another index instance added rows"""
+        state = self._state
+        mtime = self._header_mtime()
+        if mtime == state.mtime:
+            return state
+
+        header = self._read_header()
+        state = self._load_state(header["dim"], header["count"], mtime)
+        if self.search_mode == "ivf":
+            state.ivf = self._load_ivf(state)
+
+        with self._lock:
+            self._state = state
+        return state
+
+    # ----- writing -----
+    def _truncate_to(self, state):
+        """Drop bytes/lines past the header count (left by an append that failed midway)"""
+        vector_bytes = state.count * state.dim * 2
+        if os.path.exists(self._vectors_file) and os.path.getsize(self._vectors_file) > vector_bytes:
+            os.truncate(self._vectors_file, vector_bytes)
+
+        if not os.path.exists(self._docs_file):
+            return
+        with open(self._docs_file, "r+b") as f:
+            for _ in range(state.count):
+                if not f.readline():
+                    raise ValueError(f"{self._docs_file} has fewer than {state.count} rows")
+            f.truncate(f.tell())
+
+    def add_documents(self, documents):
+        """Embed and append documents, returns number added"""
+        if not documents:
+            return 0
+
+        texts = [doc.page_content for doc in documents]
+        vectors = _normalize(np.asarray(self.embedding_model.embed_documents(texts), dtype=np.float32))
+
+        with self._lock:
+            state = self._refresh()
+            if state.dim and vectors.shape[1] != state.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != index dimension {state.dim}")
+
+            self._truncate_to(state)
+            with open(self._vectors_file, "ab") as f:
+                f.write(vectors.astype(np.float16).tobytes())
+            with open(self._docs_file, "a") as f:
+                for doc in documents:
+                    f.write(json.dumps({
+                        "id": doc.id or str(uuid.uuid4()),
+                        "text": doc.page_content,
+                        "metadata": doc.metadata
+                    }) + "\n")
+
+            # Build the new state (and IVF) before the header makes the rows visible
+            new_state = self._load_state(vectors.shape[1], state.count + len(documents), None)
+            if self.search_mode == "ivf":
+                new_state.ivf = self._update_ivf(new_state) or self._load_ivf(new_state)
+            self._write_header(new_state.dim, new_state.count)
+            new_state.mtime = self._header_mtime()
+            self._state = new_state
+
+        return len(documents)
+
+    # ----- IVF -----
+    def _load_ivf(self, state):
+        if not os.path.exists(self._ivf_file) or not state.count:
+            return None
+        data = np.load(self._ivf_file)
+        centroids, assignments = data["centroids"], data["assignments"]
+        if len(assignments) < state.count:
+            # Rows appended by a writer that has not updated IVF yet
+            tail = self._assign(state.vectors, centroids, state.count - len(assignments), start=len(assignments))
+            assignments = np.concatenate([assignments, tail])
+        return _inverted_lists(centroids, assignments[:state.count])
+
+    def _assign(self, vectors, centroids, rows, start=0):
+        """Nearest centroid for `rows` rows beginning at `start`"""
+        out = np.empty(rows, dtype=np.int32)
+        for s in range(0, rows, self.BLOCK_ROWS):
+            block = np.asarray(vectors[start + s:start + min(s + self.BLOCK_ROWS, rows)], dtype=np.float32)
+            out[s:s + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        return out
+
+    def _update_ivf(self, state):
+        """
+        Train k-means once enough rows exist, then keep assignments current
+        Returns the inverted lists for `state`, or None while IVF is not trained yet
+        """
+        if state.count < self.nlist * self.MIN_ROWS_PER_LIST:
+            return None
+
+        trained_on = 0
+        if os.path.exists(self._ivf_file):
+            data = np.load(self._ivf_file)
+            centroids, assignments = data["centroids"], data["assignments"]
+            trained_on = int(data["trained_on"])
+
+        if not trained_on or state.count >= 2 * trained_on:
+            # First build, or the corpus doubled: retrain centroids
+            print(f"🧮 Training IVF ({self.nlist} lists) on {state.count} vectors...")
+            centroids = _train_kmeans(state.vectors, self.nlist)
+            assignments = self._assign(state.vectors, centroids, state.count)
+            trained_on = state.count
+        elif len(assignments) < state.count:
+            tail = self._assign(state.vectors, centroids, state.count - len(assignments), start=len(assignments))
+            assignments = np.concatenate([assignments, tail])
+        assignments = assignments[:state.count]
+
+        tmp = self._ivf_file + ".tmp.npz"
+        np.savez(tmp, centroids=centroids, assignments=assignments, trained_on=trained_on)
+        os.replace(tmp, self._ivf_file)
+        return _inverted_lists(centroids, assignments)
+
+    # ----- searching -----
+    def _filtered_rows(self, state, where):
+        """Row numbers whose metadata matches `where` (cached per corpus load)"""
+        return state.filter_cache.rows(where, state.metadatas)
+
+    def _candidate_rows(self, state, query, where=None):
+        """Rows to score: None (every row), the filtered rows and/or the probed IVF lists"""
+        allowed = self._filtered_rows(state, where) if where else None
+
+        if state.ivf is None:
+            return allowed
+
+        centroids, order, offsets = state.ivf
+        if allowed is not None and len(allowed) <= state.count * self.nprobe / len(centroids):
+            # Filter is more selective than IVF: scanning it exactly is cheaper
+            return allowed
+
+        probe = np.argsort(centroids @ query)[-self.nprobe:]
+        rows = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe]))
+        if allowed is not None:
+            rows = np.intersect1d(rows, allowed, assume_unique=True)
+        return rows
+
+    def _score(self, state, query, rows):
+        """Similarity of `rows` (None = all) to one query (dim,) or many (dim, n_queries)"""
+        if rows is None:
+            scores = np.empty((state.count,) + query.shape[1:], dtype=np.float32)
+            for s in range(0, state.count, self.BLOCK_ROWS):
+                block = np.asarray(state.vectors[s:s + self.BLOCK_ROWS], dtype=np.float32)
+                scores[s:s + len(block)] = block @ query
+            return scores
+        return np.asarray(state.vectors[rows], dtype=np.float32) @ query
+
+    def _search(self, state, embedding, k, where):
+        query = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])[0]
+        rows = self._candidate_rows(state, query, where)
+        scores = self._score(state, query, rows)
+
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top = rows[top]
+        return [self._document(state, int(i)) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k=5, where=None):
+        state = self._refresh()
+        if not state.count:
+            return []
+        return self._search(state, embedding, k, where)
+
+    def similarity_search_by_vectors(self, embeddings, k=5, where=None):
+        """Many query vectors, one result list per vector"""
+        state = self._refresh()
+        if not state.count:
+            return [[] for _ in embeddings]
+        if state.ivf is not None:
+            # IVF probes different lists per query, so search one by one
+            return [self._search(state, e, k, where) for e in embeddings]
+
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        rows = self._filtered_rows(state, where) if where else None
+        scores = self._score(state, queries.T, rows)  # One scan of the file for all queries
+
+        k = min(k, len(scores))
+        results = []
+        for column in scores.T:
+            if not k:
+                results.append([])
+                continue
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            if rows is not None:
+                top = rows[top]
+            results.append([self._document(state, int(i)) for i in top])
+        return results
+
+    def similarity_search(self, query, k=5, where=None):
+        return self.similarity_search_by_vector(self.embedding_model.embed_query(query), k, where)
+
+    def _document(self, state, i):
+        return Document(page_content=state.texts[i], metadata=state.metadatas[i], id=state.ids[i])
+
+    def get(self, where=None):
+        """Stored chunks matching `where`: {"ids", "documents", "metadatas"}"""
+        state = self._refresh()
+        rows = self._filtered_rows(state, where) if where else range(state.count)
+        return {
+            "ids": [state.ids[i] for i in rows],
+            "documents": [state.texts[i] for i in rows],
+            "metadatas": [state.metadatas[i] for i in rows]
+        }
+
+    def count(self):
+        return self._refresh().count
+
+    def stats(self):
+        state = self._refresh()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "chunks": state.count,
+            "dimensions": state.dim,
+            "search_mode": self.search_mode,
+            "ivf_ready": state.ivf is not None,
+            "vector_bytes": state.count * state.dim * 2
+        }
+
+
+# ===== HELPERS =====
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _inverted_lists(centroids, assignments):
+    """(centroids, row order grouped by list, list offsets into that order)"""
+    order = np.argsort(assignments, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+    return centroids, order, offsets
+
+
+def _train_kmeans(vectors, nlist, iterations=10, sample_size=50000, seed=42):
+    """Spherical k-means on a sample of the (normalized) vectors"""
+    rng = np.random.default_rng(seed)
+    count = len(vectors)
+    sample_rows = np.sort(rng.choice(count, size=min(count, sample_size), replace=False))
+    sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters with a random point
+                centroids[c] = sample[rng.integers(len(sample))]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+# ===== FACTORY =====
+INDEX_FOLDERS = {"chroma": "chroma_db", "mmap": "mmap_index"}  # Folder names inside a snapshot
+
+
+def index_path(backend=VECTOR_BACKEND, base_dir=None):
+    """Index folder: the configured path, or <base_dir>/<backend folder> for snapshots"""
+    if backend not in INDEX_FOLDERS:
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+    if base_dir is not None:
+        return os.path.join(base_dir, INDEX_FOLDERS[backend])
+    return DB_PATH if backend == "chroma" else MMAP_INDEX_PATH
+
+
+def get_vector_index(embedding_model, backend=VECTOR_BACKEND, base_dir=None):
+    """Open the configured vector index (created empty if missing)"""
+    path = index_path(backend, base_dir)
+    if backend == "chroma":
+        return ChromaIndex(embedding_model, path=path)
+    return MmapFlatIndex(embedding_model, path=path)
+
+
+def reset_vector_index(backend=VECTOR_BACKEND):
+    """Delete all stored vectors and recreate an empty index"""
+    path = index_path(backend)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+        print("✅ Database cleared successfully")
+    else:
+        print("⚠️ Database doesn't exist")
+
+    if backend == "chroma":
+        chroma_client = chromadb.PersistentClient(path=path)
+        chroma_client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            metadata=hnsw_metadata()
+        )
+    else:
+        os.makedirs(path, exist_ok=True)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the flat src/ modules and config/ the same way the backend does
+# (and the load test harness the way run_loadtest.py is run)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "src"), os.path.join(BACKEND_DIR, "loadtest")]
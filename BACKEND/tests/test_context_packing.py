@@ -0,0 +1,85 @@
+from langchain_core.documents import Document
+
+from context_packing import merge_chunks, pack_context, estimate_tokens
+
+
+def chunk(text, start=None, page=0, source="a.pdf"):
+    metadata = {"source_name": source, "page": page}
+    if start is not None:
+        metadata["start_index"] = start
+    return Document(page_content=text, metadata=metadata)
+
+
+# ===== merge_chunks =====
+def test_overlapping_chunks_merge_without_duplicate_text():
+    blocks = merge_chunks([chunk("Rent is paid each month.", 0), chunk("each month. Late fees apply.", 13)])
+    assert [b["text"] for b in blocks] == ["Rent is paid each month. Late fees apply."]
+
+
+def test_touching_chunks_are_joined_with_a_space():
+    # start == previous end: no separator in either chunk
+    blocks = merge_chunks([chunk("Paid each month.", 0), chunk("Clause two applies.", 16)])
+    assert [b["text"] for b in blocks] == ["Paid each month. Clause two applies."]
+
+
+def test_chunks_split_at_a_stripped_space_are_merged():
+    # start == previous end + 1: the splitter dropped the space between them
+    blocks = merge_chunks([chunk("Paid each month.", 0), chunk("Clause two applies.", 17)])
+    assert [b["text"] for b in blocks] == ["Paid each month. Clause two applies."]
+
+
+def test_distant_chunks_stay_separate():
+    blocks = merge_chunks([chunk("First part.", 0), chunk("Far later.", 500)])
+    assert [b["text"] for b in blocks] == ["First part.", "Far later."]
+
+
+def test_distant_chunks_sharing_a_phrase_stay_separate():
+    # The shared phrase is longer than the 10-character text-overlap minimum
+    blocks = merge_chunks([
+        chunk("Either party may terminate this Agreement.", 0),
+        chunk("this Agreement. Payment is due in 30 days.", 900),
+    ])
+    assert [b["text"] for b in blocks] == [
+        "Either party may terminate this Agreement.",
+        "this Agreement. Payment is due in 30 days.",
+    ]
+
+
+def test_merge_follows_document_order_and_keeps_best_rank():
+    # Reranked order puts the later chunk first
+    blocks = merge_chunks([chunk("Second half.", 11), chunk("First half.", 0), chunk("Other page.", 0, page=2)])
+    assert [(b["text"], b["rank"]) for b in blocks] == [("First half. Second half.", 0), ("Other page.", 2)]
+
+
+def test_chunks_without_start_index_merge_by_text_overlap():
+    blocks = merge_chunks([
+        chunk("The tenant shall pay rent on the first day"),
+        chunk("on the first day of every calendar month."),
+    ])
+    assert [b["text"] for b in blocks] == ["The tenant shall pay rent on the first day of every calendar month."]
+
+
+def test_different_sources_never_merge():
+    blocks = merge_chunks([chunk("Same text here.", 0, source="a.pdf"), chunk("Same text here.", 0, source="b.pdf")])
+    assert [b["source"] for b in blocks] == ["a.pdf", "b.pdf"]
+
+
+# ===== pack_context =====
+def test_small_context_is_kept_whole_and_labelled():
+    context = pack_context("rent", [chunk("Rent is due monthly.", 0, page=3)], token_budget=100)
+    assert context == "[a.pdf, page 3]\nRent is due monthly."
+
+
+def test_over_budget_keeps_query_relevant_sentences():
+    text = " ".join(
+        [f"Filler sentence number {i} about nothing." for i in range(20)]
+        + ["The termination notice period is sixty days."]
+    )
+    context = pack_context("What is the termination notice period?", [chunk(text, 0)], token_budget=30)
+    assert "termination notice period is sixty days" in context
+    assert estimate_tokens(context) <= 30
+    assert "Filler sentence number 10" not in context
+
+
+def test_empty_chunks_give_empty_context():
+    assert pack_context("anything", []) == ""
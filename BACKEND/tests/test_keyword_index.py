@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+import keyword_index
+from keyword_index import KeywordIndex
+
+TEXTS = [
+    "the tenant pays rent on the first day of each month",
+    "the landlord repairs the roof and the heating",
+    "either party may terminate with sixty days written notice",
+    "late rent incurs a fee of five percent",
+    "the deposit is returned within thirty days after the lease ends",
+    "notice must be written and delivered to the landlord",
+    "the tenant may not sublet without written consent",
+    "this lease is governed by the laws of delaware",
+]
+METADATAS = [{"page": i, "doc_type": "lease" if i % 2 else "contract"} for i in range(len(TEXTS))]
+QUERIES = ["written notice to terminate", "rent fee", "landlord repairs", "delaware law", "unknown words only"]
+
+
+@pytest.fixture(autouse=True)
+def whitespace_tokenizer(monkeypatch):
+    # Same tokenizer on both sides; keeps the test independent of nltk data downloads
+    monkeypatch.setattr(keyword_index, "tokenize", lambda text: text.lower().split())
+
+
+def build():
+    return KeywordIndex([f"id{i}" for i in range(len(TEXTS))], TEXTS, METADATAS)
+
+
+def test_scores_match_rank_bm25():
+    reference = rank_bm25.BM25Okapi([t.lower().split() for t in TEXTS])
+    rows, scores = build().get_scores(QUERIES)
+
+    assert list(rows) == list(range(len(TEXTS)))
+    for query, query_scores in zip(QUERIES, scores):
+        np.testing.assert_allclose(query_scores, reference.get_scores(query.lower().split()), rtol=1e-9, atol=1e-12)
+
+
+def test_search_ranks_like_rank_bm25():
+    reference = rank_bm25.BM25Okapi([t.lower().split() for t in TEXTS])
+    results = build().search(QUERIES, k=3)
+
+    for query, docs in zip(QUERIES, results):
+        expected = reference.get_scores(query.lower().split())
+        top = [f"id{i}" for i in np.argsort(-expected, kind="stable")[:3] if expected[i] > 0]
+        assert [d.id for d in docs] == top
+
+
+def test_filtered_search_only_scores_matching_chunks():
+    index = build()
+    where = {"doc_type": "lease"}
+    results = index.search(["written notice landlord"], k=5, where=where)[0]
+
+    assert results
+    assert all(d.metadata["doc_type"] == "lease" for d in results)
+    # Same order as the unfiltered ranking restricted to matching chunks
+    unfiltered = [d.id for d in index.search(["written notice landlord"], k=len(TEXTS))[0]]
+    assert [d.id for d in results] == [i for i in unfiltered if METADATAS[int(i[2:])]["doc_type"] == "lease"][:5]
+
+
+def test_filter_with_no_matches_returns_nothing():
+    assert build().search(["rent"], k=3, where={"doc_type": "medical"}) == [[]]
+
+
+def test_save_load_round_trip(tmp_path):
+    index = build()
+    index.save(str(tmp_path))
+    loaded = KeywordIndex.load(str(tmp_path))
+
+    assert len(loaded) == len(index)
+    np.testing.assert_allclose(loaded.get_scores(QUERIES)[1], index.get_scores(QUERIES)[1])
+    assert [d.id for d in loaded.search(["rent"], where={"page": {"$gte": 3}})[0]] == ["id3"]
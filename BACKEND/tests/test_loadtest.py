@@ -0,0 +1,60 @@
+import pytest
+
+from run_loadtest import summarize, find_saturation
+
+
+def level(concurrency, good_rps, p95_ms=100.0, error_rate=0.0):
+    return {"concurrency": concurrency, "good_rps": good_rps, "all": {"p95_ms": p95_ms, "error_rate": error_rate}}
+
+
+def saturation(levels):
+    return find_saturation(levels, min_gain=0.1, max_p95_ms=1000, max_error_rate=0.05)
+
+
+# ===== summarize =====
+def test_summarize_splits_ops_and_ignores_failed_latencies():
+    samples = [("ask", 0.1, True), ("ask", 0.2, True), ("ask", 9.0, False), ("upload", 1.0, True)]
+    summary = summarize(samples, elapsed=2.0)
+
+    assert (summary["requests"], summary["throughput_rps"], summary["good_rps"]) == (4, 2.0, 1.5)
+    assert summary["all"]["errors"] == 1 and summary["all"]["error_rate"] == 0.25
+    assert summary["ask"]["requests"] == 3 and summary["ask"]["error_rate"] == pytest.approx(0.3333)
+    assert summary["ask"]["p50_ms"] == 200.0 and summary["ask"]["p99_ms"] == 200.0  # 9s failure not counted
+    assert summary["upload"] == {
+        "requests": 1, "errors": 0, "error_rate": 0.0, "p50_ms": 1000.0, "p95_ms": 1000.0, "p99_ms": 1000.0,
+    }
+
+
+def test_summarize_empty_run():
+    summary = summarize([], elapsed=0)
+    assert (summary["requests"], summary["throughput_rps"], summary["good_rps"]) == (0, 0.0, 0.0)
+    assert summary["ask"]["p95_ms"] == 0.0 and summary["ask"]["error_rate"] == 0.0
+
+
+# ===== find_saturation =====
+def test_no_saturation_while_throughput_keeps_growing():
+    assert saturation([level(1, 10), level(2, 19), level(4, 30)]) is None
+
+
+def test_saturates_on_error_rate():
+    result = saturation([level(1, 10), level(2, 19, error_rate=0.2)])
+    assert (result["concurrency"], result["best_concurrency"], result["best_throughput_rps"]) == (2, 1, 10)
+    assert result["reason"] == "error rate 20.0% > 5.0%"
+
+
+def test_saturates_on_p95():
+    result = saturation([level(1, 10), level(2, 19), level(4, 30, p95_ms=2500)])
+    assert (result["concurrency"], result["best_concurrency"]) == (4, 2)
+    assert result["reason"] == "p95 2500ms > 1000ms"
+
+
+def test_saturates_when_throughput_stops_growing():
+    result = saturation([level(1, 10), level(2, 19), level(4, 20)])
+    assert (result["concurrency"], result["best_concurrency"], result["best_throughput_rps"]) == (4, 2, 19)
+    assert result["reason"] == "throughput 20 rps < 1.10 x best 19 rps"
+
+
+def test_first_level_can_saturate_and_reasons_combine():
+    result = saturation([level(1, 10, p95_ms=5000, error_rate=0.5)])
+    assert result["best_concurrency"] is None and result["best_throughput_rps"] is None
+    assert result["reason"] == "error rate 50.0% > 5.0%; p95 5000ms > 1000ms"
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+
+from metadata_filters import build_where, match_where, FilterCache
+
+
+# ===== build_where =====
+def test_no_filters_means_no_where():
+    assert build_where(None) is None
+    assert build_where({}) is None
+    assert build_where({"sources": [], "doc_type": None}) is None
+
+
+def test_single_condition_is_not_wrapped():
+    assert build_where({"sources": "lease.pdf"}) == {"$or": [
+        {"source_name": {"$in": ["lease.pdf"]}},
+        {"source": {"$in": ["data/contracts/lease.pdf"]}},
+    ]}
+    assert build_where({"doc_type": ["contract", "lease"]}) == {"doc_type": {"$in": ["contract", "lease"]}}
+
+
+def test_pages_forms():
+    assert build_where({"pages": 3}) == {"page": {"$in": [3]}}
+    assert build_where({"pages": [0, 2]}) == {"page": {"$in": [0, 2]}}
+    assert build_where({"pages": {"from": 1, "to": 4}}) == {
+        "$and": [{"page": {"$gte": 1}}, {"page": {"$lte": 4}}]
+    }
+
+
+@pytest.mark.parametrize("pages", ["12", True, 1.5, [1, "2"], [False], {"from": "1"}, {"to": None}])
+def test_invalid_pages_rejected(pages):
+    with pytest.raises(ValueError):
+        build_where({"pages": pages})
+
+
+def test_ingested_dates():
+    after = datetime.fromisoformat("2026-01-01").timestamp()
+    assert build_where({"ingested_after": "2026-01-01", "ingested_before": 1800000000}) == {
+        "$and": [{"ingested_at": {"$gte": after}}, {"ingested_at": {"$lte": 1800000000.0}}]
+    }
+    with pytest.raises(ValueError):
+        build_where({"ingested_after": "last tuesday"})
+
+
+def test_combined_filters_are_anded():
+    where = build_where({"sources": ["a.pdf"], "pages": [1], "doc_type": "contract"})
+    assert where == {"$and": [
+        {"$or": [{"source_name": {"$in": ["a.pdf"]}}, {"source": {"$in": ["data/contracts/a.pdf"]}}]},
+        {"page": {"$in": [1]}},
+        {"doc_type": {"$in": ["contract"]}},
+    ]}
+
+
+@pytest.mark.parametrize("filters", [["a.pdf"], {"author": "bob"}])
+def test_bad_filter_shapes_rejected(filters):
+    with pytest.raises(ValueError):
+        build_where(filters)
+
+
+def test_sources_match_chunks_without_source_name():
+    where = build_where({"sources": ["lease.pdf"]})
+    assert match_where(where, {"source_name": "lease.pdf", "source": "uploads/lease.pdf"})
+    assert match_where(where, {"source": "data/contracts/lease.pdf", "page": 2})  # ingested before source_name
+    assert not match_where(where, {"source": "data/contracts/other.pdf"})
+    assert not match_where(where, {"source_name": "other.pdf"})
+
+
+# ===== match_where =====
+def test_match_where_operators():
+    metadata = {"page": 3, "doc_type": "contract", "ingested_at": 100.0}
+    assert match_where({"doc_type": "contract"}, metadata)
+    assert match_where({"page": {"$in": [1, 3]}}, metadata)
+    assert not match_where({"page": {"$nin": [3]}}, metadata)
+    assert match_where({"ingested_at": {"$gte": 100.0, "$lt": 200.0}}, metadata)
+    assert not match_where({"doc_type": {"$ne": "contract"}}, metadata)
+
+
+def test_match_where_and_or():
+    metadata = {"page": 3, "doc_type": "contract"}
+    assert match_where({"$and": [{"page": {"$gte": 2}}, {"doc_type": "contract"}]}, metadata)
+    assert not match_where({"$and": [{"page": {"$gte": 4}}, {"doc_type": "contract"}]}, metadata)
+    assert match_where({"$or": [{"page": 9}, {"doc_type": "contract"}]}, metadata)
+
+
+def test_match_where_missing_key_and_unknown_operator():
+    assert not match_where({"page": {"$gt": 1}}, {})
+    with pytest.raises(ValueError):
+        match_where({"page": {"$regex": "x"}}, {"page": 1})
+
+
+def test_filter_cache_is_bounded():
+    cache = FilterCache(maxsize=3)
+    metadatas = [{"page": i} for i in range(10)]
+    for i in range(10):
+        assert list(cache.rows({"page": {"$gte": i}}, metadatas)) == list(range(i, 10))
+    assert len(cache) == 3
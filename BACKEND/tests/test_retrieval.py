@@ -0,0 +1,102 @@
+import sys
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+langchain_huggingface = pytest.importorskip("langchain_huggingface")
+pytest.importorskip("langchain_ollama")
+
+from langchain_core.documents import Document
+
+import vector_index
+
+
+class FakeEmbeddings:
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+
+@pytest.fixture
+def stage2(monkeypatch):
+    """stage2_retrieval imported without loading the embedding model or opening an index"""
+    monkeypatch.setattr(langchain_huggingface, "HuggingFaceEmbeddings", FakeEmbeddings)
+    monkeypatch.setattr(vector_index, "get_vector_index", lambda embedding_model: SimpleNamespace(name="stub"))
+    monkeypatch.delitem(sys.modules, "stage2_retrieval", raising=False)
+    module = importlib.import_module("stage2_retrieval")
+    yield module
+    sys.modules.pop("stage2_retrieval", None)
+
+
+def stub_llm(monkeypatch, stage2, response):
+    prompts = []
+
+    def invoke(prompt):
+        prompts.append(prompt)
+        return SimpleNamespace(content=response)
+
+    monkeypatch.setattr(stage2, "llm", SimpleNamespace(invoke=invoke))
+    return prompts
+
+
+# ===== generate_sub_queries =====
+def test_sub_queries_are_cleaned_deduplicated_and_capped(stage2, monkeypatch):
+    prompts = stub_llm(monkeypatch, stage2, "\n".join([
+        "1. notice period for termination",
+        "2) Notice period for termination",
+        "- late payment fees",
+        "",
+        "• What is the notice period?",
+        '* "deposit return"',
+        "3. one query too many",
+    ]))
+
+    queries = stage2.generate_sub_queries("What is the notice period?", n=3)
+    assert queries == [
+        "What is the notice period?",
+        "notice period for termination",
+        "late payment fees",
+        "deposit return",
+    ]
+    assert len(prompts) == 1 and "Write exactly 3 queries" in prompts[0]
+
+
+def test_sub_queries_keep_original_when_llm_adds_nothing(stage2, monkeypatch):
+    stub_llm(monkeypatch, stage2, "1. what is the notice period?")
+    assert stage2.generate_sub_queries("What is the notice period?", n=3) == ["What is the notice period?"]
+
+
+# ===== multi_query_retrieve =====
+def test_multi_query_fuses_vector_and_keyword_results(stage2, monkeypatch):
+    stub_llm(monkeypatch, stage2, "termination notice\nnotice deadline")
+    where = {"doc_type": "lease"}
+    calls = {}
+
+    def embed_texts(texts):
+        calls["embedded"] = texts
+        return [[float(i)] for i in range(len(texts))]
+
+    def similarity_search_by_vectors(embeddings, k, where):
+        calls["vector"] = (len(embeddings), k, where)
+        return [[Document(page_content="shared"), Document(page_content=f"vector {i}")] for i in range(len(embeddings))]
+
+    def search(queries, k, where):
+        calls["keyword"] = (list(queries), k, where)
+        return [[Document(page_content=f"keyword {i}"), Document(page_content="shared")] for i in range(len(queries))]
+
+    monkeypatch.setattr(stage2, "embed_texts", embed_texts)
+    monkeypatch.setattr(stage2, "vectortores", SimpleNamespace(similarity_search_by_vectors=similarity_search_by_vectors))
+    monkeypatch.setattr(stage2, "get_keyword_index", lambda: SimpleNamespace(search=search))
+
+    chunks, queries = stage2.multi_query_retrieve("What is the notice?", k=10, n=2, where=where)
+
+    assert queries == ["What is the notice?", "termination notice", "notice deadline"]
+    assert calls["embedded"] == queries
+    assert calls["vector"] == (3, 10, where)
+    assert calls["keyword"] == (queries, 10, where)
+    # Found by every query in both searches → first; then rank 1 (keyword) before rank 2 (vector) hits
+    assert [c.page_content for c in chunks] == [
+        "shared", "keyword 0", "keyword 1", "keyword 2", "vector 0", "vector 1", "vector 2",
+    ]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import ResourceScheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def sched():
+    scheduler = ResourceScheduler(interactive_threads=8, background_threads=2, background_pause=0)
+    scheduler.thread_calls = []
+    # Record thread budgets instead of calling torch.set_num_threads
+    scheduler._set_threads = scheduler.thread_calls.append
+    return scheduler
+
+
+def start_job(sched, pool, order, name, release=None):
+    def run():
+        with getattr(sched, pool)():
+            order.append(name)
+            if release is not None:
+                release.wait(timeout=5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_waiting_interactive_job_runs_before_queued_background(sched):
+    order, release = [], threading.Event()
+    holder = start_job(sched, "background", order, "ingest-1", release)
+    wait_for(lambda: order == ["ingest-1"])
+
+    background = start_job(sched, "background", order, "ingest-2")
+    wait_for(lambda: sched.stats()["queues"]["background"]["waiting"] == 1)
+    interactive = start_job(sched, "interactive", order, "query")
+    wait_for(lambda: sched.stats()["queues"]["interactive"]["waiting"] == 1)
+
+    release.set()
+    for thread in (holder, background, interactive):
+        thread.join(timeout=5)
+    assert order == ["ingest-1", "query", "ingest-2"]
+
+
+def test_jobs_never_overlap(sched):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def job(pool):
+        for _ in range(20):
+            with getattr(sched, pool)():
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.001)
+                with lock:
+                    active[0] -= 1
+
+    threads = [threading.Thread(target=job, args=(pool,)) for pool in ("interactive", "background") * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert peak[0] == 1
+    queues = sched.stats()["queues"]
+    assert queues["interactive"]["completed"] == queues["background"]["completed"] == 60
+
+
+def test_each_pool_gets_its_thread_budget(sched):
+    with sched.interactive():
+        pass
+    with sched.background():
+        pass
+    with sched.background():
+        pass
+    assert sched.thread_calls == [8, 2, 2]  # One budget per admitted job
+    assert sched.stats()["thread_budgets"] == {"interactive": 8, "background": 2}
+
+
+def test_nested_jobs_run_inline(sched):
+    done = threading.Event()
+
+    def nested():
+        with sched.interactive():
+            with sched.interactive():  # e.g. rerank inside a pipeline step
+                with sched.background():
+                    done.set()
+
+    thread = threading.Thread(target=nested)
+    thread.start()
+    thread.join(timeout=5)
+    assert done.is_set()
+    assert sched.stats()["queues"]["interactive"]["completed"] == 1
+    assert sched.stats()["running"] is None
+
+
+def test_lane_is_released_after_an_error(sched):
+    with pytest.raises(RuntimeError):
+        with sched.interactive():
+            raise RuntimeError("model failed")
+    with sched.background():
+        pass
+    assert sched.stats()["queues"]["background"]["completed"] == 1
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls, results = [], []
+    lock = threading.Lock()
+
+    def work():
+        calls.append(1)
+        release.wait(timeout=5)
+        return "answer"
+
+    def caller():
+        result = flight.do("q", work)
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=caller) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.stats()["waiting"] == 9)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 9
+    assert all(result == "answer" for result, _ in results)
+    stats = flight.stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (1, 9, 0)
+    assert stats["coalesced_ratio"] == 0.9
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == (1, False)
+    assert flight.do("b", lambda: 2) == (2, False)
+    assert flight.stats()["executions"] == 2
+
+
+def test_sequential_calls_are_not_coalesced():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do("q", lambda: next(counter)) == (0, False)
+    assert flight.do("q", lambda: next(counter)) == (1, False)
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(timeout=5)
+        raise RuntimeError("ollama down")
+
+    def caller():
+        try:
+            flight.do("q", failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    started.wait(timeout=5)
+    waiters = [threading.Thread(target=caller) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    wait_for(lambda: flight.stats()["waiting"] == 3)
+    release.set()
+    for thread in [leader] + waiters:
+        thread.join(timeout=5)
+
+    assert errors == ["ollama down"] * 4
+    assert flight.stats()["errors"] == 1
+    # The failed call is forgotten: the next caller runs again
+    assert flight.do("q", lambda: "ok") == ("ok", False)
+
+
+def test_arguments_are_passed_through():
+    flight = SingleFlight()
+    assert flight.do("k", lambda a, b=0: a + b, 2, b=3) == (5, False)
+    with pytest.raises(ZeroDivisionError):
+        flight.do("k", lambda: 1 / 0)
@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import json
+import tarfile
+import threading
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+
+import keyword_index
+from snapshot import export_snapshot, import_snapshot, open_replica, prune_replicas
+from vector_index import MmapFlatIndex
+
+DIM = 16
+MANIFEST = {"version": 3, "updated_at": 1.0, "files": {"lease.pdf": {"chunks": 30, "doc_type": "lease"}}}
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings: each text maps to a fixed random vector"""
+
+    def _vector(self, text):
+        seed = sum(ord(c) * (i + 1) for i, c in enumerate(text))
+        return np.random.default_rng(seed).normal(size=DIM).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # Whitespace tokenizer (no nltk data) and a manifest without loading the ingestion models
+    monkeypatch.setattr(keyword_index, "tokenize", lambda text: text.lower().split())
+    monkeypatch.setitem(sys.modules, "stage1_ingestion", types.SimpleNamespace(load_manifest=lambda: MANIFEST))
+
+
+@pytest.fixture
+def live(tmp_path):
+    index = MmapFlatIndex(FakeEmbeddings(), path=str(tmp_path / "live"), search_mode="exact")
+    index.add_documents([
+        Document(page_content=f"clause {i} about {'rent' if i % 3 else 'notice'}",
+                 metadata={"page": i % 4, "source_name": "lease.pdf"})
+        for i in range(30)
+    ])
+    return index
+
+
+@pytest.fixture
+def artifact(tmp_path, live):
+    path, meta = export_snapshot(out_dir=str(tmp_path / "snapshots"), lock=threading.RLock(), index=live)
+    assert (meta["chunks"], meta["corpus_version"], meta["vector_backend"]) == (30, 3, "mmap")
+    return path
+
+
+def rewrite(artifact, replace=None, extra=()):
+    """Copy of the artifact with some entries' bytes replaced and extra (name, bytes) entries appended"""
+    replace = replace or {}
+    with tarfile.open(artifact, "r:gz") as tar:
+        entries = [(m.name, replace.get(m.name) or tar.extractfile(m).read()) for m in tar]
+    tampered = artifact.replace(".tar.gz", "-tampered.tar.gz")
+    with tarfile.open(tampered, "w:gz") as tar:
+        for name, data in entries + list(extra):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return tampered
+
+
+def test_replica_serves_the_same_results(tmp_path, live, artifact):
+    folder, meta = import_snapshot(artifact, replicas_dir=str(tmp_path / "replicas"))
+    index, keywords, manifest_path, replica_meta = open_replica(folder, FakeEmbeddings())
+
+    assert index.count() == live.count() == 30
+    for query in ("clause 7", "notice"):
+        expected = live.similarity_search(query, k=5, where={"page": {"$lte": 2}})
+        actual = index.similarity_search(query, k=5, where={"page": {"$lte": 2}})
+        assert [d.page_content for d in actual] == [d.page_content for d in expected]
+    assert [d.page_content for d in keywords.search(["notice"], k=30)[0]] == [
+        f"clause {i} about notice" for i in range(0, 30, 3)
+    ]
+    with open(manifest_path) as f:
+        assert json.load(f) == MANIFEST
+    assert replica_meta["name"] == meta["name"] and replica_meta["path"] == folder
+
+
+def test_checksum_mismatch_is_rejected(tmp_path, artifact):
+    tampered = rewrite(artifact, replace={"manifest.json": b"{}"})
+    with pytest.raises(ValueError, match="Checksum mismatch: manifest.json"):
+        import_snapshot(tampered, replicas_dir=str(tmp_path / "replicas"))
+    assert os.listdir(tmp_path / "replicas") == []
+
+
+def test_unexpected_entry_is_rejected(tmp_path, artifact):
+    tampered = rewrite(artifact, extra=[("../escape.sh", b"echo hi")])
+    with pytest.raises(ValueError, match="Unexpected entry in snapshot: ../escape.sh"):
+        import_snapshot(tampered, replicas_dir=str(tmp_path / "replicas"))
+    assert not (tmp_path / "escape.sh").exists()
+
+
+def test_prune_keeps_newest_and_active_replicas(tmp_path):
+    replicas = tmp_path / "replicas"
+    for age, name in enumerate(["newest", "older", "active", "oldest"]):
+        (replicas / name).mkdir(parents=True)
+        os.utime(replicas / name, (1000 - age, 1000 - age))
+
+    prune_replicas([str(replicas / "active"), None], replicas_dir=str(replicas), keep=1)
+    assert sorted(os.listdir(replicas)) == ["active", "newest"]
@@ -0,0 +1,96 @@
+import sys
+import types
+import importlib
+import threading
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+import metadata_filters
+
+
+def unused(*args, **kwargs):
+    raise AssertionError("not stubbed")
+
+
+@pytest.fixture
+def stage4(monkeypatch):
+    """stage4_answer imported against placeholder stage 2/3 modules (no models, no Ollama)"""
+    stage2 = types.ModuleType("stage2_retrieval")
+    for name in ("rewrite_query", "hyde_retrieve", "hybrid_search", "generate_hypothetical",
+                 "hyde_search_batch", "hybrid_search_batch", "multi_query_retrieve"):
+        setattr(stage2, name, unused)
+    stage2.build_where = metadata_filters.build_where
+    stage2.llm = SimpleNamespace(invoke=unused)
+    stage3 = types.ModuleType("stage3_rerank")
+    stage3.rerank_chunks = stage3.rerank_chunks_batch = unused
+
+    monkeypatch.setitem(sys.modules, "stage2_retrieval", stage2)
+    monkeypatch.setitem(sys.modules, "stage3_rerank", stage3)
+    monkeypatch.delitem(sys.modules, "stage4_answer", raising=False)
+    module = importlib.import_module("stage4_answer")
+    yield module
+    sys.modules.pop("stage4_answer", None)
+
+
+@pytest.fixture
+def pipeline(stage4, monkeypatch):
+    """Stubbed LLM, searches and reranker; records the questions searched per wave"""
+    calls = SimpleNamespace(waves=[], answered=threading.Event(), answered_before_last_wave=None)
+
+    def rewrite_query(question, doc_type):
+        if question == "broken":
+            raise RuntimeError("ollama down")
+        return f"rewritten {question}"
+
+    def hyde_search_batch(fake_answers, k, where, background):
+        questions = [a.split()[-1] for a in fake_answers]
+        if "q4" in questions:
+            # Wave 1's answer is generated while this later wave is still being searched
+            calls.answered_before_last_wave = calls.answered.wait(timeout=5)
+        calls.waves.append(questions)
+        return [[] if q == "empty" else [Document(page_content=f"hyde {q}")] for q in questions]
+
+    def hybrid_search_batch(rewritten, k, where, background):
+        return [[] if r.endswith("empty") else [Document(page_content=f"hybrid {r}")] for r in rewritten]
+
+    def invoke(prompt):
+        question = prompt.split("Question: ")[1].split("\n")[0]
+        if question == "q0":
+            calls.answered.set()
+        return SimpleNamespace(content=f"answer to {question}")
+
+    monkeypatch.setattr(stage4, "rewrite_query", rewrite_query)
+    monkeypatch.setattr(stage4, "generate_hypothetical", lambda rewritten: f"fake {rewritten}")
+    monkeypatch.setattr(stage4, "hyde_search_batch", hyde_search_batch)
+    monkeypatch.setattr(stage4, "hybrid_search_batch", hybrid_search_batch)
+    monkeypatch.setattr(stage4, "rerank_chunks_batch", lambda queries, lists, top_k: [c[:top_k] for c in lists])
+    monkeypatch.setattr(stage4, "llm", SimpleNamespace(invoke=invoke))
+    return calls
+
+
+def test_batch_yields_one_line_per_question(stage4, pipeline):
+    questions = ["q0", "broken", "q2", "empty", "q4"]
+    results = list(stage4.full_rag_pipeline_batch(questions, max_concurrency=2, wave_size=2))
+
+    by_index = {r["index"]: r for r in results}
+    assert sorted(by_index) == list(range(len(questions)))
+    assert all(by_index[i]["question"] == q for i, q in enumerate(questions))
+    assert by_index[1] == {"index": 1, "question": "broken", "error": "ollama down", "status": "failed"}
+    assert by_index[3]["answer"] == stage4.NO_MATCH_ANSWER
+    for i in (0, 2, 4):
+        assert (by_index[i]["answer"], by_index[i]["status"]) == (f"answer to {questions[i]}", "success")
+
+
+def test_batch_runs_in_waves_and_answers_early(stage4, pipeline):
+    list(stage4.full_rag_pipeline_batch(["q0", "broken", "q2", "empty", "q4"], max_concurrency=2, wave_size=2))
+
+    assert pipeline.waves == [["q0"], ["q2", "empty"], ["q4"]]
+    assert pipeline.answered_before_last_wave
+
+
+def test_batch_rejects_bad_filters_before_any_work(stage4, pipeline):
+    with pytest.raises(ValueError):
+        list(stage4.full_rag_pipeline_batch(["q0"], filters={"pages": "12"}))
+    assert pipeline.waves == []
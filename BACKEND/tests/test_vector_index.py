@@ -0,0 +1,161 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+
+import vector_index
+from metadata_filters import match_where
+from vector_index import ChromaIndex, MmapFlatIndex
+
+DIM = 16
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings: each text maps to a fixed random vector"""
+
+    def __init__(self):
+        self.vectors = {}
+
+    def _vector(self, text):
+        if text not in self.vectors:
+            seed = sum(ord(c) * (i + 1) for i, c in enumerate(text))
+            self.vectors[text] = np.random.default_rng(seed).normal(size=DIM).tolist()
+        return self.vectors[text]
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def make_docs(count, prefix="chunk"):
+    return [
+        Document(page_content=f"{prefix} {i}", metadata={"page": i % 5, "doc_type": "contract" if i % 2 else "lease"})
+        for i in range(count)
+    ]
+
+
+def brute_force(embeddings, docs, query, k, where=None):
+    """Reference ranking: cosine similarity over every (matching) document"""
+    rows = [d for d in docs if not where or match_where(where, d.metadata)]
+    vectors = np.array(embeddings.embed_documents([d.page_content for d in rows]))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = np.array(query) / np.linalg.norm(query)
+    order = np.argsort(-(vectors @ q))[:k]
+    return [rows[i].page_content for i in order]
+
+
+# ===== MmapFlatIndex =====
+def test_exact_search_matches_brute_force(tmp_path):
+    embeddings = FakeEmbeddings()
+    docs = make_docs(200)
+    index = MmapFlatIndex(embeddings, path=str(tmp_path), search_mode="exact")
+    index.add_documents(docs[:120])
+    index.add_documents(docs[120:])
+
+    query = embeddings.embed_query("question")
+    results = [d.page_content for d in index.similarity_search("question", k=5)]
+    assert results == brute_force(embeddings, docs, query, 5)
+    assert index.count() == 200
+
+
+def test_filtered_search_only_returns_matches(tmp_path):
+    embeddings = FakeEmbeddings()
+    docs = make_docs(100)
+    index = MmapFlatIndex(embeddings, path=str(tmp_path), search_mode="exact")
+    index.add_documents(docs)
+
+    where = {"$and": [{"doc_type": "contract"}, {"page": {"$in": [1, 3]}}]}
+    query = embeddings.embed_query("question")
+    results = index.similarity_search("question", k=5, where=where)
+    assert [d.page_content for d in results] == brute_force(embeddings, docs, query, 5, where)
+    assert all(match_where(where, d.metadata) for d in results)
+    assert len(index.get(where=where)["ids"]) == sum(match_where(where, d.metadata) for d in docs)
+
+
+def test_batch_search_equals_single_searches(tmp_path):
+    embeddings = FakeEmbeddings()
+    index = MmapFlatIndex(embeddings, path=str(tmp_path), search_mode="exact")
+    index.add_documents(make_docs(80))
+
+    queries = [embeddings.embed_query(q) for q in ("alpha", "beta", "gamma")]
+    where = {"page": {"$lte": 2}}
+    batch = index.similarity_search_by_vectors(queries, k=4, where=where)
+    single = [index.similarity_search_by_vector(q, k=4, where=where) for q in queries]
+    assert [[d.page_content for d in r] for r in batch] == [[d.page_content for d in r] for r in single]
+
+
+def test_ivf_with_all_lists_probed_is_exact(tmp_path):
+    embeddings = FakeEmbeddings()
+    docs = make_docs(64)
+    index = MmapFlatIndex(embeddings, path=str(tmp_path), search_mode="ivf", nlist=4, nprobe=4)
+    index.add_documents(docs)
+    assert index.stats()["ivf_ready"]
+
+    query = embeddings.embed_query("question")
+    results = [d.page_content for d in index.similarity_search("question", k=5)]
+    assert results == brute_force(embeddings, docs, query, 5)
+
+
+def test_ivf_falls_back_to_exact_until_trained(tmp_path):
+    index = MmapFlatIndex(FakeEmbeddings(), path=str(tmp_path), search_mode="ivf", nlist=16, nprobe=2)
+    index.add_documents(make_docs(10))
+    assert not index.stats()["ivf_ready"]
+    assert len(index.similarity_search("question", k=3)) == 3
+
+
+def test_second_instance_sees_new_rows(tmp_path):
+    embeddings = FakeEmbeddings()
+    writer = MmapFlatIndex(embeddings, path=str(tmp_path))
+    reader = MmapFlatIndex(embeddings, path=str(tmp_path))
+    assert reader.count() == 0
+
+    writer.add_documents(make_docs(7))
+    assert reader.count() == 7
+    assert reader.similarity_search("chunk 3", k=1)[0].page_content == "chunk 3"
+
+
+def test_append_after_torn_write_keeps_rows_aligned(tmp_path):
+    embeddings = FakeEmbeddings()
+    index = MmapFlatIndex(embeddings, path=str(tmp_path))
+    index.add_documents(make_docs(10))
+
+    # A write that died after appending but before the header update
+    with open(tmp_path / "vectors.f16", "ab") as f:
+        f.write(b"\0" * 10)
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write(json.dumps({"id": "orphan", "text": "orphan", "metadata": {}}) + "\n")
+
+    index.add_documents(make_docs(5, prefix="new"))
+    assert (tmp_path / "vectors.f16").stat().st_size == 15 * DIM * 2
+    assert "orphan" not in MmapFlatIndex(embeddings, path=str(tmp_path)).get()["ids"]
+    for text in ("new 2", "chunk 9"):
+        assert index.similarity_search(text, k=1)[0].page_content == text
+
+
+# ===== ChromaIndex =====
+def test_chroma_applies_new_ef_search_on_open(tmp_path, monkeypatch):
+    ChromaIndex(FakeEmbeddings(), path=str(tmp_path)).add_documents(make_docs(5))
+    monkeypatch.setattr(vector_index, "HNSW_EF_SEARCH", 123)
+
+    ChromaIndex(FakeEmbeddings(), path=str(tmp_path))
+    index = ChromaIndex(FakeEmbeddings(), path=str(tmp_path))  # Reopened: nothing left to change
+    assert index.collection.configuration["hnsw"]["ef_search"] == 123
+    assert index.stats()["hnsw"]["hnsw:search_ef"] == 123
+    assert index.similarity_search("chunk 2", k=1)[0].page_content == "chunk 2"
+
+
+def test_chroma_warns_and_reports_build_time_mismatch(tmp_path, monkeypatch, capsys):
+    built_with = vector_index.HNSW_M
+    ChromaIndex(FakeEmbeddings(), path=str(tmp_path))
+    monkeypatch.setattr(vector_index, "HNSW_M", built_with * 2)
+
+    index = ChromaIndex(FakeEmbeddings(), path=str(tmp_path))
+    assert f"hnsw:M={built_with} (settings: {built_with * 2})" in capsys.readouterr().out
+    assert index.stats()["hnsw"]["hnsw:M"] == built_with